@@ -4,7 +4,9 @@ from app.db.session import get_db
 from app.schemas.auth import UserRegister, SendOTPRequest, VerifyOTPRequest, Token, PasswordChange, ForgotPasswordRequest, ResetPasswordRequest
 from app.schemas.user import UserResponse
 from app.services.auth_service import AuthService
-from app.api.dependencies import get_current_user
+from app.api.dependencies import get_current_user, oauth2_scheme
+from app.core.security import decode_access_token
+from app.utils.token_revocation import revoke_token
 from app.db.models import User
 
 router = APIRouter()
@@ -27,6 +29,12 @@ async def verify_otp(request: VerifyOTPRequest, db: AsyncSession = Depends(get_d
     token = await auth_service.verify_otp_and_login(request)
     return token
 
+@router.post("/auth/logout", status_code=status.HTTP_200_OK)
+async def logout(token: str = Depends(oauth2_scheme)):
+    payload = decode_access_token(token)
+    await revoke_token(payload)
+    return {"message": "Logged out successfully"}
+
 @router.post("/auth/forgot-password", status_code=status.HTTP_200_OK)
 async def forgot_password(request: ForgotPasswordRequest, db: AsyncSession = Depends(get_db)):
     auth_service = AuthService(db)
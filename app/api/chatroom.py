@@ -1,83 +1,345 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+import asyncio
+import base64
+import binascii
+import json
+import time
+from datetime import datetime
+from typing import Optional, Set
+from fastapi import APIRouter, Depends, status, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_db
+from app.db.session import get_db, async_session
 from app.db.models import User
-from app.schemas.chatroom import ChatroomCreate, ChatroomListResponse, ChatroomResponse, MessageCreate, MessageResponse
-from app.services.chatroom_service import ChatroomService
-from app.api.dependencies import get_current_user
-from app.utils.cache import get_cached_data, set_cached_data, invalidate_cache
-from app.core.exceptions import ChatroomNotFoundException
-from app.tasks.worker import process_gemini_message
+from app.schemas.chatroom import ChatroomCreate, ChatroomListResponse, ChatroomPage, ChatroomResponse, ChatroomDetailResponse, MessageCreate, MessageResponse, MessagePage, MessageSearchPage, MessageSearchResult
+from app.services.chatroom_service import ChatroomService, chatroom_list_key
+from app.services.export_service import ExportService, export_headers, export_media_type
+from app.services.gemini_service import get_gemini_service
+from app.api.dependencies import get_token_user, get_websocket_user
+from app.utils.cache import get_or_set, invalidate_cache
+from app.core.config import settings
+from app.core.exceptions import ChatroomNotFoundException, InvalidCursorException
+from app.tasks.queues import queue_for_role
+from app.tasks.worker import process_gemini_message, refresh_chatroom_summary
 from app.utils.rate_limiter import check_rate_limit
+from app.utils.subscription_cache import get_subscription_tier
+from app.utils.admission import admit_ai_job, release_ai_job
+from app.utils.chatroom_events import tail_chatroom
 from app.db.models import Message
 
 router = APIRouter()
 
+_chatroom_page_adapter = TypeAdapter(ChatroomPage)
+
 @router.post("/chatroom", response_model=ChatroomResponse, status_code=status.HTTP_201_CREATED)
 async def create_chatroom(
     chatroom_data: ChatroomCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_token_user),
     db: AsyncSession = Depends(get_db)
 ):
     chatroom_service = ChatroomService(db)
     chatroom = await chatroom_service.create_chatroom(current_user.id, chatroom_data)
-    await invalidate_cache(f"chatrooms_user_{current_user.id}") 
+    await invalidate_cache(chatroom_list_key(current_user.id)) 
     return chatroom
 
-@router.get("/chatroom", response_model=list[ChatroomListResponse], status_code=status.HTTP_200_OK)
+def _encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise InvalidCursorException()
+    if not isinstance(values, list):
+        raise InvalidCursorException()
+    return values
+
+def _decode_chatroom_cursor(cursor: str):
+    try:
+        last_message_at, chatroom_id = _decode_cursor(cursor)
+        return datetime.fromisoformat(last_message_at), int(chatroom_id)
+    except (ValueError, TypeError):
+        raise InvalidCursorException()
+
+@router.get("/chatroom", response_model=ChatroomPage, status_code=status.HTTP_200_OK)
 async def list_chatrooms(
-    current_user: User = Depends(get_current_user),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(settings.CHATROOM_PAGE_SIZE, ge=1, le=settings.CHATROOM_PAGE_SIZE_MAX),
+    current_user: User = Depends(get_token_user),
     db: AsyncSession = Depends(get_db)
 ):
-    cache_key = f"chatrooms_user_{current_user.id}"
-    cached_chatrooms = await get_cached_data(cache_key)
-    if cached_chatrooms:
-        print(f"Returning cached chatrooms for user {current_user.id}")
-        return [ChatroomListResponse(**c) for c in cached_chatrooms]
+    before = _decode_chatroom_cursor(cursor) if cursor else None
 
-    chatroom_service = ChatroomService(db)
-    chatrooms = await chatroom_service.get_user_chatrooms(current_user.id)
-    chatrooms_data = [ChatroomListResponse.model_validate(c).model_dump() for c in chatrooms] 
-    await set_cached_data(cache_key, chatrooms_data, ttl=300) 
-    print(f"Fetched chatrooms from DB and cached for user {current_user.id}")
-    return chatrooms
+    # The cache holds the finished JSON body: hits skip model construction and
+    # response_model serialization entirely.
+    async def load_chatrooms() -> bytes:
+        chatrooms, has_more = await ChatroomService(db).get_user_chatrooms(current_user.id, before=before, limit=limit)
+        last = chatrooms[-1] if chatrooms else None
+        return _chatroom_page_adapter.dump_json(ChatroomPage(
+            chatrooms=[ChatroomListResponse.model_validate(c) for c in chatrooms],
+            has_more=has_more,
+            next_cursor=_encode_cursor(last.last_message_at.isoformat(), last.id) if has_more else None
+        ))
+
+    # Only the default first page is cached; it is what the sidebar loads and
+    # what new messages invalidate. Deeper pages are cheap index range scans.
+    if before is None and limit == settings.CHATROOM_PAGE_SIZE:
+        body = await get_or_set(chatroom_list_key(current_user.id), load_chatrooms, ttl=300, raw=True)
+    else:
+        body = await load_chatrooms()
+    return Response(content=body, media_type="application/json")
 
-@router.get("/chatroom/{chatroom_id}", response_model=ChatroomResponse, status_code=status.HTTP_200_OK)
+@router.get("/chatroom/{chatroom_id}", response_model=ChatroomDetailResponse, status_code=status.HTTP_200_OK)
 async def get_chatroom_details(
     chatroom_id: int,
-    current_user: User = Depends(get_current_user),
+    limit: int = Query(settings.MESSAGE_PAGE_SIZE, ge=1, le=settings.MESSAGE_PAGE_SIZE_MAX),
+    current_user: User = Depends(get_token_user),
     db: AsyncSession = Depends(get_db)
 ):
     chatroom_service = ChatroomService(db)
     chatroom = await chatroom_service.get_chatroom_by_id(chatroom_id, current_user.id)
     if not chatroom:
         raise ChatroomNotFoundException()
-    return chatroom
 
-@router.post("/chatroom/{chatroom_id}/message", response_model=MessageResponse, status_code=status.HTTP_201_CREATED) 
-async def send_message_to_chatroom(
+    messages, has_more = await chatroom_service.get_messages(chatroom_id, limit=limit)
+    return ChatroomDetailResponse(
+        **ChatroomResponse.model_validate(chatroom).model_dump(),
+        messages=[MessageResponse.model_validate(m) for m in messages],
+        has_more_messages=has_more
+    )
+
+@router.get("/chatroom/{chatroom_id}/messages", response_model=MessagePage, status_code=status.HTTP_200_OK)
+async def list_chatroom_messages(
     chatroom_id: int,
-    message_data: MessageCreate,
-    current_user: User = Depends(get_current_user),
+    before: Optional[int] = Query(None, ge=1),
+    after: Optional[int] = Query(None, ge=0),
+    limit: int = Query(settings.MESSAGE_PAGE_SIZE, ge=1, le=settings.MESSAGE_PAGE_SIZE_MAX),
+    current_user: User = Depends(get_token_user),
     db: AsyncSession = Depends(get_db)
 ):
-    await check_rate_limit(current_user.id, db) 
+    if before is not None and after is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use either 'before' or 'after', not both")
 
     chatroom_service = ChatroomService(db)
     chatroom = await chatroom_service.get_chatroom_by_id(chatroom_id, current_user.id)
     if not chatroom:
         raise ChatroomNotFoundException()
 
-    
-    user_message = await chatroom_service.add_message_to_chatroom(chatroom_id, "user", message_data.content)
+    messages, has_more = await chatroom_service.get_messages(chatroom_id, before=before, after=after, limit=limit)
+    return MessagePage(
+        messages=[MessageResponse.model_validate(m) for m in messages],
+        has_more=has_more,
+        next_before=messages[0].id if messages else before,
+        next_after=messages[-1].id if messages else after
+    )
 
-    
-    chat_history = []
-    for msg in chatroom.messages:
-        chat_history.append({"role": msg.sender, "content": msg.content})
+def _decode_search_cursor(cursor: str):
+    try:
+        rank, message_id = _decode_cursor(cursor)
+        return float(rank), int(message_id)
+    except (ValueError, TypeError):
+        raise InvalidCursorException()
+
+@router.get("/messages/search", response_model=MessageSearchPage, status_code=status.HTTP_200_OK)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=256),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(settings.SEARCH_PAGE_SIZE, ge=1, le=settings.SEARCH_PAGE_SIZE_MAX),
+    current_user: User = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
+):
+    after = _decode_search_cursor(cursor) if cursor else None
+    rows, has_more = await ChatroomService(db).search_messages(current_user.id, q, cursor=after, limit=limit)
+    return MessageSearchPage(
+        results=[MessageSearchResult.model_validate(dict(row)) for row in rows],
+        next_cursor=_encode_cursor(rows[-1]["rank"], rows[-1]["id"]) if has_more else None
+    )
+
+@router.get("/chatroom/{chatroom_id}/export", status_code=status.HTTP_200_OK)
+async def export_chatroom(
+    chatroom_id: int,
+    gzip: bool = Query(False),
+    current_user: User = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
+):
+    chatroom = await ChatroomService(db).get_chatroom_by_id(chatroom_id, current_user.id)
+    if not chatroom:
+        raise ChatroomNotFoundException()
+
+    # The body outlives the request's session, so the export opens its own.
+    async def stream():
+        async with async_session() as export_db:
+            async for chunk in ExportService(export_db).export_chatroom(chatroom_id, gzip=gzip):
+                yield chunk
+
+    return StreamingResponse(
+        stream(),
+        media_type=export_media_type(gzip),
+        headers=export_headers(f"chatroom-{chatroom_id}", gzip)
+    )
+
+async def _store_user_message(chatroom_id: int, content: str, current_user: User, db: AsyncSession):
+    # Tier comes from the subscription cache, which webhooks keep current, so
+    # admission, quota and queue routing agree even when the token's role is stale.
+    tier = await get_subscription_tier(current_user.id, fallback=current_user.role)
+    # Admission runs first so shed requests neither use up quota nor store a message.
+    ticket = await admit_ai_job(current_user.id, tier, chatroom_id)
+    try:
+        await check_rate_limit(current_user, tier) 
+        user_message, chat_history = await ChatroomService(db).send_user_message(chatroom_id, current_user.id, content)
+    except BaseException:
+        await release_ai_job(ticket)
+        raise
+
+    return user_message, chat_history, ticket, tier
+
+@router.post("/chatroom/{chatroom_id}/message", response_model=MessageResponse, status_code=status.HTTP_201_CREATED) 
+async def send_message_to_chatroom(
+    chatroom_id: int,
+    message_data: MessageCreate,
+    current_user: User = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
+):
+    user_message, chat_history, ticket, tier = await _store_user_message(chatroom_id, message_data.content, current_user, db)
 
     
     
-    process_gemini_message.delay(chatroom_id, message_data.content, chat_history)
+    try:
+        process_gemini_message.apply_async(
+            args=(chatroom_id, message_data.content, chat_history),
+            kwargs={"enqueued_at": time.time(), "admission_ticket": ticket},
+            queue=queue_for_role(tier)
+        )
+    except Exception:
+        await release_ai_job(ticket)
+        raise
+
+    return user_message
+
+def _sse_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+async def _save_ai_message(chatroom_id: int, content: str) -> Message:
+    async with async_session() as db:
+        return await ChatroomService(db).add_message_to_chatroom(chatroom_id, "ai", content)
+
+# The event loop only keeps weak references to tasks; saves that outlive their
+# request are held here until they finish.
+_background_saves: Set[asyncio.Task] = set()
+
+def _save_finished(task: asyncio.Task):
+    _background_saves.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Failed to save partial AI reply: {task.exception()}")
+
+def _save_in_background(chatroom_id: int, content: str) -> asyncio.Task:
+    task = asyncio.create_task(_save_ai_message(chatroom_id, content))
+    _background_saves.add(task)
+    task.add_done_callback(_save_finished)
+    return task
+
+class _AdmittedStreamingResponse(StreamingResponse):
+    # Releases the admission ticket however the response ends. A finally in the
+    # body generator is not enough: when the client disconnects before the body
+    # starts, the generator never runs and the ticket would hold the chatroom
+    # until its lease expires.
+    def __init__(self, content, ticket: dict, **kwargs):
+        super().__init__(content, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await release_ai_job(self.ticket)
+
+async def _stream_ai_events(chatroom_id: int, user_message: Message, prompt: str, chat_history: list):
+    yield _sse_event("message", MessageResponse.model_validate(user_message).model_dump_json())
+
+    gemini_service = get_gemini_service()
+    chunks = []
+    try:
+        async for chunk in gemini_service.stream_gemini_response(prompt, chat_history):
+            chunks.append(chunk)
+            yield _sse_event("delta", json.dumps({"content": chunk}))
+    except (asyncio.CancelledError, GeneratorExit):
+        # Client went away mid-stream; keep whatever was generated so the reply
+        # is still visible in the chatroom history.
+        if chunks:
+            _save_in_background(chatroom_id, "".join(chunks))
+        raise
+    except Exception as e:
+        print(f"Error streaming Gemini message for chatroom {chatroom_id}: {e}")
+        if not chunks:
+            chunks = ["Sorry, I couldn't process your request right now. Please try again later."]
+        yield _sse_event("error", json.dumps({"detail": "Gemini response was interrupted"}))
+
+    ai_message = await _save_ai_message(chatroom_id, "".join(chunks))
+    yield _sse_event("done", MessageResponse.model_validate(ai_message).model_dump_json())
+
+    if settings.GEMINI_SUMMARY_ENABLED:
+        refresh_chatroom_summary.delay(chatroom_id)
+
+@router.post("/chatroom/{chatroom_id}/message/stream", status_code=status.HTTP_200_OK)
+async def stream_message_to_chatroom(
+    chatroom_id: int,
+    message_data: MessageCreate,
+    current_user: User = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
+):
+    user_message, chat_history, ticket, _ = await _store_user_message(chatroom_id, message_data.content, current_user, db)
+
+    return _AdmittedStreamingResponse(
+        _stream_ai_events(chatroom_id, user_message, message_data.content, chat_history),
+        ticket,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _forward_chatroom_events(websocket: WebSocket, chatroom_id: int, last_id: Optional[str]):
+    async for batch in tail_chatroom(chatroom_id, last_id):
+        if not batch:
+            # Idle heartbeat keeps load balancers from dropping the socket.
+            await websocket.send_text(json.dumps({"type": "ping"}))
+        for event_id, message in batch:
+            await websocket.send_text(json.dumps({"type": "message", "id": event_id, "message": message}))
+
+async def _drain_client(websocket: WebSocket):
+    # Nothing is expected from the client; reading is how a disconnect is noticed.
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+@router.websocket("/chatroom/{chatroom_id}/ws")
+async def chatroom_events(
+    websocket: WebSocket,
+    chatroom_id: int,
+    token: str = Query(...),
+    last_id: Optional[str] = Query(None)
+):
+    current_user = await get_websocket_user(token)
+    if current_user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    async with async_session() as db:
+        chatroom = await ChatroomService(db).get_chatroom_by_id(chatroom_id, current_user.id)
+    if not chatroom:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
 
-    return user_message
\ No newline at end of file
+    await websocket.accept()
+    forwarder = asyncio.create_task(_forward_chatroom_events(websocket, chatroom_id, last_id))
+    reader = asyncio.create_task(_drain_client(websocket))
+    try:
+        done, _ = await asyncio.wait({forwarder, reader}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        forwarder.cancel()
+        reader.cancel()
+    if forwarder in done and not forwarder.cancelled() and forwarder.exception() is not None:
+        print(f"Chatroom {chatroom_id} event stream failed: {forwarder.exception()}")
+        try:
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        except RuntimeError:
+            pass
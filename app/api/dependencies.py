@@ -1,24 +1,58 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
+from app.core.config import settings
 from app.core.security import decode_access_token
 from app.db.models import User
-from sqlalchemy.future import select
+from app.utils.user_cache import get_cached_user, cache_user
+from app.utils.token_revocation import is_token_revoked
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/verify-otp")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+async def _load_user(user_id: int, db: AsyncSession) -> User:
+    user = await get_cached_user(user_id)
+    if user is not None:
+        return user
+    user = await db.get(User, user_id)
+    if user is None:
+        raise _credentials_exception()
+    await cache_user(user)
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
     payload = decode_access_token(token)
     user_id: str = payload.get("sub")
-    if user_id is None:
-        raise credentials_exception
-    user = await db.get(User, int(user_id))
-    if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+    if user_id is None or await is_token_revoked(payload):
+        raise _credentials_exception()
+    return await _load_user(int(user_id), db)
+
+# For endpoints that only need the caller's id and role.
+async def get_token_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
+    payload = decode_access_token(token)
+    user_id: str = payload.get("sub")
+    if user_id is None or await is_token_revoked(payload):
+        raise _credentials_exception()
+    if settings.JWT_ROLE_CLAIMS and payload.get("role"):
+        return User(id=int(user_id), role=payload["role"])
+    return await _load_user(int(user_id), db)
+
+# Browsers cannot set headers on a WebSocket handshake, so sockets pass the
+# token in the query string. Returns None instead of raising.
+async def get_websocket_user(token: str) -> Optional[User]:
+    try:
+        payload = decode_access_token(token)
+        user_id = payload.get("sub")
+        if user_id is None or await is_token_revoked(payload):
+            return None
+    except HTTPException:
+        return None
+    return User(id=int(user_id), role=payload.get("role"))
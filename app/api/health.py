@@ -0,0 +1,26 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from app.core.security import password_hash_stats
+from app.core.startup import startup_state
+from app.tasks.queues import get_queue_stats
+
+router = APIRouter()
+
+@router.get("/health/live", status_code=status.HTTP_200_OK)
+async def liveness():
+    return {"status": "ok"}
+
+@router.get("/health/ready", status_code=status.HTTP_200_OK)
+async def readiness():
+    report = startup_state.report()
+    if not startup_state.ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=report)
+    return report
+
+@router.get("/health/queues", status_code=status.HTTP_200_OK)
+async def queue_health():
+    return {"queues": await get_queue_stats()}
+
+@router.get("/health/password-hashing", status_code=status.HTTP_200_OK)
+async def password_hashing_health():
+    return password_hash_stats()
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.core.metrics import CELERY_QUEUE_DEPTH, render_metrics
+from app.tasks.queues import get_queue_depths
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Queue depth lives in the broker, so it is sampled at scrape time.
+    try:
+        for queue, depth in (await get_queue_depths()).items():
+            CELERY_QUEUE_DEPTH.labels(queue).set(depth)
+    except Exception as e:
+        print(f"Failed to read queue depths: {e}")
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
@@ -4,9 +4,10 @@ from app.db.session import get_db
 from app.db.models import User
 from app.schemas.subscription import SubscriptionStatus
 from app.services.payment_service import PaymentService
-from app.api.dependencies import get_current_user
-from app.core.config import settings
-import stripe
+from app.api.dependencies import get_current_user, get_token_user
+from app.utils.subscription_cache import get_subscription_state
+from app.tasks.queues import WEBHOOK_QUEUE
+from app.tasks.worker import process_stripe_event
 
 router = APIRouter()
 
@@ -24,33 +25,16 @@ async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_db)):
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
 
-    try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
-        )
-    except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid payload")
-    except stripe.error.SignatureVerificationError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid signature")
-
     payment_service = PaymentService(db)
-    await payment_service.handle_stripe_webhook_event(event)
+    event_id = await payment_service.record_webhook_event(payload, sig_header)
+
+    # Acknowledge as soon as the event is stored; the worker applies it. If the
+    # enqueue fails Stripe gets a 5xx and redelivers, which re-enqueues it.
+    if event_id:
+        process_stripe_event.apply_async(args=(event_id,), queue=WEBHOOK_QUEUE)
 
     return {"status": "success"}
 
 @router.get("/subscription/status", response_model=SubscriptionStatus, status_code=status.HTTP_200_OK)
-async def get_subscription_status(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
-    payment_service = PaymentService(db)
-    subscription = await payment_service.get_user_subscription_status(current_user.id)
-
-    if not subscription:
-        return SubscriptionStatus(tier=current_user.role, status="no_subscription")
-    
-    return SubscriptionStatus(
-        tier=subscription.tier,
-        status=subscription.status,
-        current_period_end=subscription.current_period_end
-    )
\ No newline at end of file
+async def get_subscription_status(current_user: User = Depends(get_token_user)):
+    return SubscriptionStatus(**await get_subscription_state(current_user.id))
\ No newline at end of file
@@ -1,10 +1,31 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import StreamingResponse
 from app.db.models import User
+from app.db.session import async_session
 from app.schemas.user import UserResponse
-from app.api.dependencies import get_current_user
+from app.api.dependencies import get_current_user, get_token_user
+from app.services.export_service import ExportService, export_headers, export_media_type
 
 router = APIRouter()
 
 @router.get("/user/me", response_model=UserResponse, status_code=status.HTTP_200_OK)
 async def get_current_user_details(current_user: User = Depends(get_current_user)):
-    return current_user
\ No newline at end of file
+    return current_user
+
+@router.get("/user/me/export", status_code=status.HTTP_200_OK)
+async def export_current_user_history(
+    gzip: bool = Query(False),
+    current_user: User = Depends(get_token_user)
+):
+    user_id = current_user.id
+
+    async def stream():
+        async with async_session() as db:
+            async for chunk in ExportService(db).export_user(user_id, gzip=gzip):
+                yield chunk
+
+    return StreamingResponse(
+        stream(),
+        media_type=export_media_type(gzip),
+        headers=export_headers(f"user-{user_id}", gzip)
+    )
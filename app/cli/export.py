@@ -0,0 +1,50 @@
+"""Export chatroom history as NDJSON from the command line.
+
+Shares ExportService with the HTTP export endpoints, so the output format is
+identical and memory stays flat for any history size.
+
+    python -m app.cli.export --chatroom 42 --output chatroom-42.ndjson
+    python -m app.cli.export --user 7 --gzip --output user-7.ndjson.gz
+    python -m app.cli.export --user 7 | jq 'select(.type == "message")'
+"""
+import argparse
+import asyncio
+import sys
+
+from app.db.models import Chatroom
+from app.db.session import async_session, engine
+from app.services.export_service import ExportService
+
+async def export(args: argparse.Namespace) -> int:
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async with async_session() as db:
+            service = ExportService(db)
+            if args.chatroom is not None:
+                if await db.get(Chatroom, args.chatroom) is None:
+                    print(f"Chatroom {args.chatroom} not found", file=sys.stderr)
+                    return 1
+                chunks = service.export_chatroom(args.chatroom, gzip=args.gzip)
+            else:
+                chunks = service.export_user(args.user, gzip=args.gzip)
+            async for chunk in chunks:
+                out.write(chunk)
+        out.flush()
+    finally:
+        if args.output:
+            out.close()
+        await engine.dispose()
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream chatroom history as NDJSON")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--chatroom", type=int, help="export one chatroom")
+    target.add_argument("--user", type=int, help="export every chatroom a user owns")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    parser.add_argument("--output", help="file to write (default: stdout)")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(export(args)))
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,50 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Gemini Backend Clone"
     API_STR: str = "/api"
 
+    ENVIRONMENT: str = "development"
+
     DATABASE_URL: str
+    # Create missing tables at startup. Defaults to on outside production, where
+    # the schema is managed with `alembic upgrade head` instead.
+    DB_AUTO_CREATE: Optional[bool] = None
+    DB_POOL_WARM_SIZE: int = 5
+    SQL_ECHO: bool = False
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 32
+    JWT_CACHE_SIZE: int = 10000
+    JWT_REVOCATION_REFRESH_SECONDS: float = 5
+    # Backoff before retrying a refresh that failed; the last snapshot is used meanwhile.
+    JWT_REVOCATION_RETRY_SECONDS: float = 1
+    JWT_REVOCATION_BLOOM_CAPACITY: int = 100000
+    # Carry the user's role in the JWT so id/role-only endpoints skip the user lookup.
+    # Role changes then take effect when the token is reissued.
+    JWT_ROLE_CLAIMS: bool = False
 
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     REDIS_PASSWORD: str = ""
+    REDIS_MAX_CONNECTIONS: int = 100
+
+    CACHE_LOCAL_SIZE: int = 10000
+    CACHE_LOCAL_TTL_SECONDS: float = 5
+    CACHE_LOCK_TIMEOUT_MS: int = 5000
+    CACHE_LOCK_WAIT_MS: int = 2000
+    CACHE_EARLY_REFRESH_BETA: float = 1.0
+
+    USER_CACHE_TTL_SECONDS: int = 300
+    USER_CACHE_LOCAL_TTL_SECONDS: int = 30
+    SUBSCRIPTION_CACHE_TTL_SECONDS: int = 3600
+    SUBSCRIPTION_CACHE_LOCAL_TTL_SECONDS: int = 30
 
     STRIPE_SECRET_KEY: str = os.getenv("STRIPE_SECRET_KEY")
     STRIPE_PUBLISHABLE_KEY: str = os.getenv("STRIPE_PUBLISHABLE_KEY")
@@ -21,11 +52,90 @@ class Settings(BaseSettings):
     STRIPE_WEBHOOK_SECRET: str = os.getenv("STRIPE_WEBHOOK_SECRET")
     STRIPE_PRO_PRODUCT_ID: str = os.getenv("STRIPE_PRO_PRODUCT_ID")
     STRIPE_PRO_PRICE_ID: str = os.getenv("STRIPE_PRO_PRICE_ID")
+    # Stripe SDK calls are blocking; they run on a small thread pool that reuses
+    # one HTTP session per thread.
+    STRIPE_MAX_WORKERS: int = 8
+    STRIPE_TIMEOUT_SECONDS: float = 20
+    STRIPE_MAX_NETWORK_RETRIES: int = 2
+    STRIPE_WEBHOOK_MAX_RETRIES: int = 5
+    # Point the SDK at another host, e.g. the load-test fake Stripe API.
+    STRIPE_API_BASE: Optional[str] = None
 
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
+    GEMINI_MODEL_NAME: str = "gemini-pro"
+    GEMINI_GENERATION_CONFIG: dict = {}
+    GEMINI_RESPONSE_CACHE_ENABLED: bool = False
+    GEMINI_RESPONSE_CACHE_TTL_SECONDS: int = 86400
+    GEMINI_RESPONSE_CACHE_MAX_ENTRIES: int = 100000
+    GEMINI_RESPONSE_CACHE_MAX_BYTES: int = 32768
+    # Point the SDK (REST transport) at another host, e.g. a local fake Gemini server.
+    GEMINI_API_ENDPOINT: Optional[str] = None
+    GEMINI_REQUESTS_PER_SECOND: float = 10
+    GEMINI_BURST: int = 20
+    GEMINI_CONCURRENCY_INITIAL: int = 16
+    GEMINI_CONCURRENCY_MIN: int = 1
+    GEMINI_CONCURRENCY_MAX: int = 128
+    GEMINI_REQUEST_TIMEOUT_SECONDS: float = 30
+    GEMINI_DEADLINE_SECONDS: float = 60
+    GEMINI_MAX_RETRIES: int = 3
+    GEMINI_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    GEMINI_RETRY_MAX_DELAY_SECONDS: float = 8
+    GEMINI_BREAKER_FAILURE_THRESHOLD: int = 5
+    GEMINI_BREAKER_RESET_SECONDS: float = 30
+    GEMINI_HEDGE_ENABLED: bool = False
+    GEMINI_HEDGE_DELAY_SECONDS: float = 2.0
+
+    MESSAGE_PAGE_SIZE: int = 50
+    MESSAGE_PAGE_SIZE_MAX: int = 200
+    CHATROOM_PAGE_SIZE: int = 50
+    CHATROOM_PAGE_SIZE_MAX: int = 200
+    CHATROOM_PREVIEW_LENGTH: int = 120
+    CHATROOM_EVENTS_MAXLEN: int = 200
+    CHATROOM_EVENTS_TTL_SECONDS: int = 86400
+    CHATROOM_EVENTS_BLOCK_MS: int = 20000
+    CHATROOM_EVENTS_BATCH_SIZE: int = 100
+    CHATROOM_EVENTS_MAX_CONNECTIONS: int = 1000
+    MESSAGE_PARTITION_MONTHS_AHEAD: int = 3
+    MESSAGE_PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 21600
+    MESSAGE_ARCHIVE_ENABLED: bool = True
+    MESSAGE_ARCHIVE_AFTER_MONTHS: int = 6
+    MESSAGE_ARCHIVE_DIR: str = "archive/messages"
+    MESSAGE_ARCHIVE_BATCH_SIZE: int = 10000
+    EXPORT_BATCH_SIZE: int = 1000
+    EXPORT_CHUNK_BYTES: int = 65536
+    SEARCH_TEXT_CONFIG: str = "english"
+    SEARCH_PAGE_SIZE: int = 20
+    SEARCH_PAGE_SIZE_MAX: int = 100
+
+    GEMINI_CONTEXT_TOKEN_BUDGET: int = 4000
+    GEMINI_CONTEXT_MAX_MESSAGES: int = 200
+    GEMINI_SUMMARY_ENABLED: bool = False
+    GEMINI_SUMMARY_MIN_MESSAGES: int = 20
+    GEMINI_SUMMARY_BATCH_SIZE: int = 100
+
+    RATE_LIMIT_BASIC_DAILY_PROMPTS: int = 5
+    RATE_LIMIT_PRO_DAILY_PROMPTS: int = -1
+    RATE_LIMIT_BURST: int = 10
+    RATE_LIMIT_REFILL_PER_SECOND: float = 0.5
+    RATE_LIMIT_FLUSH_INTERVAL_SECONDS: int = 60
+    RATE_LIMIT_FLUSH_BATCH_SIZE: int = 500
+
+    ADMISSION_MAX_OUTSTANDING: int = 5000
+    ADMISSION_BASIC_SHARE: float = 0.7
+    ADMISSION_MAX_PER_USER: int = 5
+    ADMISSION_MAX_PER_CHATROOM: int = 1
+    ADMISSION_JOB_LEASE_SECONDS: int = 300
+    ADMISSION_RETRY_AFTER_SECONDS: int = 5
 
     CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL")
     CELERY_RESULT_BACKEND: str = os.getenv("CELERY_RESULT_BACKEND")
+    # Tasks accepted per worker process vs. jobs actually executing; the gap is
+    # where queued jobs are ordered by WORKER_QUEUE_WEIGHTS.
+    WORKER_CONCURRENCY: int = 300
+    WORKER_MAX_IN_FLIGHT: int = 200
+    WORKER_QUEUE_WEIGHTS: dict = {"gemini.pro": 4, "gemini.basic": 1, "webhooks": 1, "celery": 1}
+    # Workers serve /metrics on this port when set.
+    WORKER_METRICS_PORT: Optional[int] = None
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -1,4 +1,5 @@
 from fastapi import HTTPException, status
+from typing import Optional
 
 class UserAlreadyExistsException(HTTPException):
     def __init__(self):
@@ -29,6 +30,13 @@ class ChatroomNotFoundException(HTTPException):
             detail="Chatroom not found"
         )
 
+class InvalidCursorException(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
 class SubscriptionNotFoundException(HTTPException):
     def __init__(self):
         super().__init__(
@@ -37,10 +45,50 @@ class SubscriptionNotFoundException(HTTPException):
         )
 
 class DailyUsageLimitExceededException(HTTPException):
-    def __init__(self):
+    def __init__(self, retry_after: Optional[int] = None):
         super().__init__(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Daily message limit exceeded for your Basic tier. Upgrade to Pro for more."
+            detail="Daily message limit exceeded for your Basic tier. Upgrade to Pro for more.",
+            headers={"Retry-After": str(retry_after)} if retry_after else None
+        )
+
+class RateLimitExceededException(HTTPException):
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many messages in a short period. Please slow down.",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+class ServiceOverloadedException(HTTPException):
+    def __init__(self, retry_after: int = 5):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The service is busy right now. Please retry shortly.",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+class AuthUnavailableException(HTTPException):
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not verify credentials right now. Please retry shortly.",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+class TooManyInFlightException(HTTPException):
+    def __init__(self, detail: str, retry_after: int = 5):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+class InvalidWebhookException(HTTPException):
+    def __init__(self, detail: str = "Invalid webhook"):
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail
         )
 
 class PaymentProcessingError(HTTPException):
@@ -0,0 +1,158 @@
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests currently being served", multiprocess_mode="livesum"
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL statement latency by route or task", ["route"], buckets=QUERY_BUCKETS
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements issued per request or task", ["route"], buckets=QUERY_COUNT_BUCKETS
+)
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by outcome", ["cache", "result"])
+
+RATE_LIMIT_DECISIONS = Counter("rate_limit_decisions_total", "Rate limiter decisions", ["tier", "decision"])
+
+GEMINI_REQUEST_DURATION = Histogram(
+    "gemini_request_duration_seconds", "Gemini call latency, retries included", ["method", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+GEMINI_FIRST_CHUNK_DURATION = Histogram(
+    "gemini_first_chunk_seconds", "Time to the first streamed Gemini chunk", buckets=LATENCY_BUCKETS
+)
+GEMINI_TOKENS = Histogram("gemini_tokens", "Tokens per Gemini call", ["method", "kind"], buckets=TOKEN_BUCKETS)
+GEMINI_ERRORS = Counter("gemini_errors_total", "Failed Gemini calls by exception type", ["method", "error"])
+
+CELERY_TASK_DURATION = Histogram(
+    "celery_task_duration_seconds", "Celery task runtime", ["task", "queue", "state"], buckets=LATENCY_BUCKETS
+)
+CELERY_QUEUE_WAIT = Histogram(
+    "celery_queue_wait_seconds", "Time jobs spent queued before a worker picked them up", ["queue"],
+    buckets=LATENCY_BUCKETS
+)
+CELERY_QUEUE_DEPTH = Gauge("celery_queue_depth", "Messages waiting in each broker queue", ["queue"], multiprocess_mode="max")
+
+class QueryStats:
+    def __init__(self, route: Optional[str] = None):
+        self.route = route
+        self.durations: List[float] = []
+
+    def observe(self, route: Optional[str] = None):
+        route = route or self.route or "unknown"
+        for duration in self.durations:
+            DB_QUERY_DURATION.labels(route).observe(duration)
+        DB_QUERIES_PER_REQUEST.labels(route).observe(len(self.durations))
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+@contextmanager
+def track_queries(route: str):
+    stats = QueryStats(route)
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+        stats.observe()
+
+def instrument_engine(engine):
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+        stats = _query_stats.get()
+        if stats is None:
+            DB_QUERY_DURATION.labels("background").observe(elapsed)
+        else:
+            stats.durations.append(elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(exception_context):
+        started = exception_context.connection.info.get("query_started_at") if exception_context.connection else None
+        if started:
+            started.pop()
+
+_KEY_ID = re.compile(r"[_:][0-9a-f]{6,}$|[_:]\d+(?=$|[_:])")
+
+def cache_name(key: str) -> str:
+    # Strip ids so per-user keys share one label, e.g. chatrooms_v2_user_42 -> chatrooms_v2_user.
+    return _KEY_ID.sub("", key)
+
+def record_cache(key: str, result: str):
+    CACHE_REQUESTS.labels(cache_name(key), result).inc()
+
+def _route_label(scope) -> str:
+    # Route templates, never raw paths, keep label cardinality bounded.
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        started = time.perf_counter()
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            _query_stats.reset(token)
+            route = _route_label(scope)
+            HTTP_REQUEST_DURATION.labels(scope["method"], route, str(status_code)).observe(time.perf_counter() - started)
+            stats.observe(route)
+
+def render_metrics() -> bytes:
+    # With several server processes, prometheus_client writes samples under
+    # PROMETHEUS_MULTIPROC_DIR and they are merged at scrape time.
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
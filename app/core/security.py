@@ -1,13 +1,21 @@
+import asyncio
+import hashlib
+import multiprocessing
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Deque, Dict, Optional, Tuple
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.exceptions import ServiceOverloadedException
 from fastapi import HTTPException, status
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -15,23 +23,109 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+# bcrypt is CPU-bound for 100ms+, so it runs in a separate process pool instead
+# of on the event loop. Callers beyond the pool size plus PASSWORD_HASH_QUEUE_LIMIT
+# are turned away with a 503 rather than queueing without bound.
+_hash_executor: Optional[ProcessPoolExecutor] = None
+_hash_slots: Optional[asyncio.Semaphore] = None
+_hash_latencies: Deque[float] = deque(maxlen=1000)
+
+def init_password_hasher():
+    global _hash_executor, _hash_slots
+    if _hash_executor is None:
+        _hash_executor = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        _hash_slots = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_LIMIT)
+
+def shutdown_password_hasher():
+    global _hash_executor, _hash_slots
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+    _hash_executor = None
+    _hash_slots = None
+
+async def warm_password_hasher():
+    # One hash per worker at once forces every process to spawn and import
+    # passlib now instead of on the first logins.
+    await asyncio.gather(*(hash_password_async("warm-up") for _ in range(settings.PASSWORD_HASH_WORKERS)))
+
+async def _run_in_hasher(func, *args):
+    init_password_hasher()
+    if _hash_slots.locked():
+        raise ServiceOverloadedException(retry_after=1)
+    async with _hash_slots:
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+        finally:
+            _hash_latencies.append(time.perf_counter() - started)
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_hasher(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_hasher(verify_password, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await _run_in_hasher(verify_and_update_password, plain_password, hashed_password)
+
+def password_hash_stats() -> Dict[str, float]:
+    latencies = sorted(_hash_latencies)
+    if not latencies:
+        return {"samples": 0, "p50_seconds": 0.0, "p95_seconds": 0.0, "max_seconds": 0.0}
+    return {
+        "samples": len(latencies),
+        "p50_seconds": latencies[len(latencies) // 2],
+        "p95_seconds": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+        "max_seconds": latencies[-1],
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
+    now = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+        expire = now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+# Verified tokens keyed by their SHA-256 digest, so repeat requests with the
+# same bearer token skip signature verification and JSON parsing. Callers get
+# a copy, so nothing they do to the payload leaks into later requests.
+_verified_tokens: "OrderedDict[bytes, dict]" = OrderedDict()
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 def decode_access_token(token: str):
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = _verified_tokens.get(digest)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            _verified_tokens.move_to_end(digest)
+            return dict(payload)
+        del _verified_tokens[digest]
+        raise _credentials_exception()
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        raise _credentials_exception()
+
+    if "exp" not in payload:
+        return payload
+    _verified_tokens[digest] = payload
+    while len(_verified_tokens) > settings.JWT_CACHE_SIZE:
+        _verified_tokens.popitem(last=False)
+    return dict(payload)
\ No newline at end of file
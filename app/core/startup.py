@@ -0,0 +1,41 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+class StartupState:
+    # Tracks how long each boot phase took and whether the process is ready
+    # for traffic. Created at import, so "imports" covers loading the app.
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self.ready_after: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 3)
+
+    def mark(self, name: str):
+        # Records the time since the previous phase ended, e.g. module imports.
+        elapsed = time.perf_counter() - self.started_at - sum(self.phases.values())
+        self.phases[name] = round(elapsed, 3)
+
+    def mark_ready(self):
+        self.ready = True
+        self.last_error = None
+        self.ready_after = round(time.perf_counter() - self.started_at, 3)
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "ready_after_seconds": self.ready_after,
+            "phases": dict(self.phases),
+            "last_error": self.last_error,
+        }
+
+startup_state = StartupState()
\ No newline at end of file
@@ -0,0 +1,22 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+
+# The databases the app runs on: Postgres in production, SQLite for tests and
+# the load-test harness. Each maps to its INSERT construct (for ON CONFLICT)
+# and its two-argument max. Resolved from DATABASE_URL at import, so anything
+# else fails at startup rather than on the first upsert.
+_DIALECTS = {
+    "postgresql": (postgresql.insert, func.greatest),
+    "sqlite": (sqlite.insert, func.max),
+}
+
+def resolve(database_url: str):
+    backend = make_url(database_url).get_backend_name()
+    if backend not in _DIALECTS:
+        raise RuntimeError(f"Unsupported database {backend!r} in DATABASE_URL; use postgresql or sqlite")
+    return _DIALECTS[backend]
+
+insert, greatest = resolve(settings.DATABASE_URL)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, ForeignKey, Boolean, DDL, Index, JSON, Text, UniqueConstraint, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.sql import func, text
 from app.db.base import Base
 from enum import Enum
 
@@ -24,27 +25,53 @@ class User(Base):
 
 class Chatroom(Base):
     __tablename__ = "chatrooms"
+    __table_args__ = (
+        Index("ix_chatrooms_user_id_last_message_at", "user_id", text("last_message_at DESC"), text("id DESC")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"))
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
+    # Kept current by add_message_to_chatroom so the room list needs no join.
+    last_message_at = Column(DateTime, server_default=func.now(), nullable=False)
+    last_message_preview = Column(String, nullable=True)
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     owner = relationship("User", back_populates="chatrooms")
     messages = relationship("Message", back_populates="chatroom")
 
+# On Postgres, migration 0008 turns messages into a table range-partitioned
+# by month on sent_at, with primary key (id, sent_at). id still comes from one
+# sequence and stays unique, so the ORM keeps treating it as the identity.
+# Schemas made with create_all (SQLite, development) stay unpartitioned.
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_chatroom_id_id", "chatroom_id", "id"),
+        # btree_gin lets one GIN index answer "this chatroom AND matches the
+        # query", so a search only touches the user's own matching rows.
+        Index("ix_messages_chatroom_id_search_vector", "chatroom_id", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     chatroom_id = Column(Integer, ForeignKey("chatrooms.id"))
     sender = Column(String, nullable=False) 
     content = Column(String, nullable=False)
-    sent_at = Column(DateTime, server_default=func.now())
+    sent_at = Column(DateTime, server_default=func.now(), nullable=False)
+    search_vector = deferred(Column(Text().with_variant(TSVECTOR(), "postgresql"), nullable=True))
 
     chatroom = relationship("Chatroom", back_populates="messages")
 
+event.listen(
+    Message.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gin").execute_if(dialect="postgresql")
+)
+
 class OTP(Base):
     __tablename__ = "otps"
 
@@ -72,10 +99,56 @@ class Subscription(Base):
 
 class DailyUsage(Base):
     __tablename__ = "daily_usage"
+    __table_args__ = (
+        UniqueConstraint("user_id", "date", name="uq_daily_usage_user_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     date = Column(DateTime, server_default=func.now())
     prompt_count = Column(Integer, default=0)
 
-    user = relationship("User", back_populates="usage_stats")
\ No newline at end of file
+    user = relationship("User", back_populates="usage_stats")
+
+class StripeEvent(Base):
+    __tablename__ = "stripe_events"
+
+    id = Column(String, primary_key=True)
+    type = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, default="pending")
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime, server_default=func.now())
+    processed_at = Column(DateTime, nullable=True)
+
+# A month of messages moved out of Postgres into a Parquet file.
+class MessageArchive(Base):
+    __tablename__ = "message_archives"
+
+    id = Column(Integer, primary_key=True, index=True)
+    partition_name = Column(String, unique=True, nullable=False)
+    period_start = Column(DateTime, nullable=False)
+    period_end = Column(DateTime, nullable=False)
+    path = Column(String, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+    chatrooms = relationship("MessageArchiveChatroom", back_populates="archive")
+
+# Which archives hold which chatrooms, so history reads open only the files
+# that contain the room.
+class MessageArchiveChatroom(Base):
+    __tablename__ = "message_archive_chatrooms"
+    __table_args__ = (
+        Index("ix_message_archive_chatrooms_chatroom_id_max_id", "chatroom_id", "max_id"),
+    )
+
+    archive_id = Column(Integer, ForeignKey("message_archives.id"), primary_key=True)
+    chatroom_id = Column(Integer, primary_key=True)
+    min_id = Column(Integer, nullable=False)
+    max_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+
+    archive = relationship("MessageArchive", back_populates="chatrooms")
@@ -0,0 +1,77 @@
+import re
+from datetime import date
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.config import settings
+
+# Monthly range partitions of messages are named messages_yYYYYmMM and cover
+# [first of month, first of next month).
+_PARTITION_NAME = re.compile(r"^messages_y(\d{4})m(\d{2})$")
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"messages_y{month.year:04d}m{month.month:02d}"
+
+def partition_month(name: str) -> Optional[date]:
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+async def messages_partitioned(conn: AsyncConnection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    result = await conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'messages' AND c.relnamespace = current_schema()::regnamespace"
+    ))
+    return result.first() is not None
+
+async def list_message_partitions(conn: AsyncConnection) -> List[Tuple[str, date]]:
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'messages' AND p.relnamespace = current_schema()::regnamespace"
+    ))
+    partitions = []
+    for (name,) in result.all():
+        month = partition_month(name)
+        if month is not None:
+            partitions.append((name, month))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+async def ensure_message_partitions(conn: AsyncConnection, months_ahead: Optional[int] = None) -> List[str]:
+    # Creates this month's partition and the next few, so inserts never find
+    # a missing range. Does nothing when messages is not partitioned.
+    if not await messages_partitioned(conn):
+        return []
+    months_ahead = settings.MESSAGE_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    # API replicas and the beat task may all run this at once.
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('messages_partitions'))"))
+    existing = {name for name, _ in await list_message_partitions(conn)}
+    # sent_at defaults to the database's now(), so its clock picks the month.
+    current = (await conn.execute(text("SELECT date_trunc('month', now())::date"))).scalar_one()
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        # Partition DDL cannot take bind parameters; the bounds are dates we formatted.
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+        created.append(name)
+    return created
@@ -1,13 +1,26 @@
+import asyncio
+
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.core.metrics import instrument_engine
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+engine = create_async_engine(settings.DATABASE_URL, echo=settings.SQL_ECHO)
+instrument_engine(engine)
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
 async def get_db():
     async with async_session() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+async def warm_pool(connections: int):
+    # Hold several connections at once so the pool opens that many up front.
+    async def _connect():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(_connect() for _ in range(max(connections, 1))))
\ No newline at end of file
@@ -1,31 +1,97 @@
+from app.core.startup import startup_state
+
+import asyncio
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from contextlib import asynccontextmanager
 
-from app.api import auth, chatroom, subscription, user
+from app.api import auth, chatroom, health, metrics, subscription, user
 from app.core.config import settings
-from app.db.session import engine
+from app.db.partitions import ensure_message_partitions
+from app.db.session import engine, warm_pool
 from app.db.base import Base
+from app.utils.cache import init_redis_cache, close_redis_cache, get_redis_client, start_invalidation_listener
+from app.utils.chatroom_events import close_event_streams
+from app.core.security import init_password_hasher, shutdown_password_hasher, warm_password_hasher
+from app.services.gemini_service import get_gemini_service
+from app.services.payment_service import get_stripe
+from app.core.metrics import MetricsMiddleware
+
+def _auto_create_schema() -> bool:
+    if settings.DB_AUTO_CREATE is not None:
+        return settings.DB_AUTO_CREATE
+    return settings.ENVIRONMENT != "production"
+
+def _preload_sdks():
+    get_gemini_service()
+    get_stripe()
+
+async def _warm_up():
+    # Runs after the server starts listening: /health/live answers at once and
+    # /health/ready flips only when the pools have real connections and workers.
+    while True:
+        try:
+            with startup_state.phase("warm_database"):
+                await warm_pool(settings.DB_POOL_WARM_SIZE)
+            # Inserts into a partitioned messages table fail without a partition
+            # for the current month, so readiness waits on it.
+            with startup_state.phase("ensure_message_partitions"):
+                async with engine.begin() as conn:
+                    await ensure_message_partitions(conn)
+            with startup_state.phase("warm_redis"):
+                await (await get_redis_client()).ping()
+            with startup_state.phase("warm_password_hasher"):
+                await warm_password_hasher()
+            break
+        except Exception as e:
+            startup_state.last_error = str(e)
+            print(f"Warm-up failed, retrying: {e}")
+            await asyncio.sleep(2)
+    startup_state.mark_ready()
+    print(f"Startup report: {startup_state.report()}")
+
+    # The SDKs stay out of the boot path; load them in a thread now so the first
+    # AI or billing request does not pay for the import.
+    try:
+        with startup_state.phase("preload_sdks"):
+            await asyncio.get_running_loop().run_in_executor(None, _preload_sdks)
+    except Exception as e:
+        print(f"SDK preload failed; they will load on first use: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    startup_state.mark("imports")
+    if _auto_create_schema():
+        with startup_state.phase("create_schema"):
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+    with startup_state.phase("init_redis"):
+        await init_redis_cache()
+        start_invalidation_listener()
+    init_password_hasher()
+    warm_up = asyncio.create_task(_warm_up())
     yield
+    warm_up.cancel()
+    shutdown_password_hasher()
+    await close_event_streams()
+    await close_redis_cache()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_STR}/openapi.json",
     lifespan=lifespan
 )
+app.add_middleware(MetricsMiddleware)
 
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
+        # Keep Retry-After, WWW-Authenticate and the like set by the exception.
+        headers=getattr(exc, "headers", None),
     )
 
 @app.exception_handler(RequestValidationError)
@@ -39,6 +105,8 @@ app.include_router(auth.router, prefix=settings.API_STR)
 app.include_router(chatroom.router, prefix=settings.API_STR)
 app.include_router(subscription.router, prefix=settings.API_STR)
 app.include_router(user.router, prefix=settings.API_STR)
+app.include_router(health.router, prefix=settings.API_STR)
+app.include_router(metrics.router)
 
 @app.get("/")
 async def root():
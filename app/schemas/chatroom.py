@@ -18,22 +18,52 @@ class MessageResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class MessagePage(BaseModel):
+    messages: List[MessageResponse]
+    has_more: bool
+    next_before: Optional[int] = None
+    next_after: Optional[int] = None
+
+class MessageSearchResult(BaseModel):
+    id: int
+    chatroom_id: int
+    chatroom_name: str
+    sender: str
+    sent_at: datetime
+    highlight: str
+    rank: float
+
+class MessageSearchPage(BaseModel):
+    results: List[MessageSearchResult]
+    next_cursor: Optional[str] = None
+
 class ChatroomResponse(BaseModel):
     id: int
     name: str
     user_id: int
     created_at: datetime
     updated_at: datetime
-    messages: List[MessageResponse] = []
 
     class Config:
         from_attributes = True
 
+class ChatroomDetailResponse(ChatroomResponse):
+    messages: List[MessageResponse] = []
+    has_more_messages: bool = False
+
 class ChatroomListResponse(BaseModel):
     id: int
     name: str
     user_id: int
     created_at: datetime
+    last_message_at: datetime
+    last_message_preview: Optional[str] = None
+    message_count: int = 0
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ChatroomPage(BaseModel):
+    chatrooms: List[ChatroomListResponse]
+    has_more: bool
+    next_cursor: Optional[str] = None
@@ -0,0 +1,246 @@
+import asyncio
+import os
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.db.models import Message, MessageArchive, MessageArchiveChatroom
+from app.db.partitions import add_months, list_message_partitions, messages_partitioned, month_start
+from app.utils.cache import get_or_set, invalidate_cache
+
+ARCHIVE_COLUMNS = ["id", "chatroom_id", "sender", "content", "sent_at"]
+
+_pyarrow = None
+
+def get_pyarrow():
+    # pyarrow is only needed by the archive job and by reads of archived
+    # history, so it is imported on first use.
+    global _pyarrow
+    if _pyarrow is None:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+        _pyarrow = pyarrow
+    return _pyarrow
+
+def _archive_schema():
+    pa = get_pyarrow()
+    return pa.schema([
+        ("id", pa.int64()),
+        ("chatroom_id", pa.int64()),
+        ("sender", pa.string()),
+        ("content", pa.string()),
+        ("sent_at", pa.timestamp("us")),
+    ])
+
+def archive_range_key(chatroom_id: int) -> str:
+    return f"message_archive_range_{chatroom_id}"
+
+def archive_path(file_name: str) -> str:
+    return os.path.join(settings.MESSAGE_ARCHIVE_DIR, file_name)
+
+def read_archived_rows(file_name: str, chatroom_id: int, before: Optional[int] = None, after: Optional[int] = None) -> List[dict]:
+    # Files are sorted by (chatroom_id, id), so row-group statistics let the
+    # reader skip every group that does not hold this chatroom.
+    filters = [("chatroom_id", "=", chatroom_id)]
+    if before is not None:
+        filters.append(("id", "<", before))
+    if after is not None:
+        filters.append(("id", ">", after))
+    table = get_pyarrow().parquet.read_table(archive_path(file_name), columns=ARCHIVE_COLUMNS, filters=filters)
+    return table.to_pylist()
+
+def iter_archived_batches(file_name: str, chatroom_id: int, batch_size: int) -> Iterator[List[dict]]:
+    # Streams one chatroom's rows from a file a batch at a time, for exports
+    # that must not load a whole month into memory.
+    pa = get_pyarrow()
+    dataset = pa.dataset.dataset(archive_path(file_name), format="parquet")
+    for batch in dataset.to_batches(
+        columns=ARCHIVE_COLUMNS,
+        filter=pa.dataset.field("chatroom_id") == chatroom_id,
+        batch_size=batch_size,
+    ):
+        if batch.num_rows:
+            yield batch.to_pylist()
+
+class ArchiveService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def archive_cold_partitions(self) -> List[str]:
+        conn = await self.db.connection()
+        if not await messages_partitioned(conn):
+            return []
+        cutoff = add_months(month_start(datetime.utcnow().date()), -settings.MESSAGE_ARCHIVE_AFTER_MONTHS)
+        archived = []
+        for name, month in await list_message_partitions(conn):
+            if month >= cutoff:
+                break
+            await self.archive_partition(name, month)
+            archived.append(name)
+        return archived
+
+    async def archive_partition(self, name: str, month: date) -> MessageArchive:
+        # Copies the partition to Parquet and records the file in one short
+        # transaction, then detaches and drops the partition outside it. A plain
+        # DETACH takes ACCESS EXCLUSIVE on messages and would stall every read
+        # and send for as long as the copy took. Rows sit in both places until
+        # the drop; readers never take the same id from both. Each step can be
+        # re-run, so a job that dies halfway is finished by the next run.
+        archive = await self.db.scalar(select(MessageArchive).where(MessageArchive.partition_name == name))
+        if archive is None:
+            archive = await self._copy_partition(name, month)
+        chatroom_ids = list((await self.db.execute(
+            select(MessageArchiveChatroom.chatroom_id).where(MessageArchiveChatroom.archive_id == archive.id)
+        )).scalars().all())
+        await self.db.commit()
+
+        # Readers must see the new archive before its rows leave Postgres, and
+        # must not keep a range cached by a load that raced the first pass.
+        await self._invalidate_ranges(chatroom_ids)
+        await self._detach_partition(name)
+        await self._invalidate_ranges(chatroom_ids)
+        print(f"Archived {archive.row_count} messages from {name} to {archive_path(archive.path)}")
+        return archive
+
+    async def _copy_partition(self, name: str, month: date) -> MessageArchive:
+        pa = get_pyarrow()
+        schema = _archive_schema()
+        loop = asyncio.get_running_loop()
+        os.makedirs(settings.MESSAGE_ARCHIVE_DIR, exist_ok=True)
+        file_name = f"{name}.parquet"
+        path = archive_path(file_name)
+        tmp_path = f"{path}.tmp"
+
+        # The partition is months old, but block stray writes while it is copied.
+        # Only the partition is locked, never messages itself.
+        await self.db.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+        result = await self.db.stream(
+            text(f"SELECT id, chatroom_id, sender, content, sent_at FROM {name} ORDER BY chatroom_id, id")
+            .execution_options(yield_per=settings.MESSAGE_ARCHIVE_BATCH_SIZE)
+        )
+
+        rooms: Dict[int, list] = {}
+        row_count = 0
+        writer = pa.parquet.ParquetWriter(tmp_path, schema, compression="zstd")
+        try:
+            async for rows in result.partitions():
+                columns = {column: [] for column in ARCHIVE_COLUMNS}
+                for row in rows:
+                    for column, value in zip(ARCHIVE_COLUMNS, row):
+                        columns[column].append(value)
+                    if row.chatroom_id is not None:
+                        stats = rooms.setdefault(row.chatroom_id, [row.id, row.id, 0])
+                        stats[1] = row.id
+                        stats[2] += 1
+                row_count += len(rows)
+                await loop.run_in_executor(None, writer.write_table, pa.Table.from_pydict(columns, schema=schema))
+        finally:
+            writer.close()
+        os.replace(tmp_path, path)
+
+        archive = MessageArchive(
+            partition_name=name,
+            period_start=month,
+            period_end=add_months(month, 1),
+            path=file_name,
+            row_count=row_count,
+            size_bytes=os.path.getsize(path),
+        )
+        self.db.add(archive)
+        await self.db.flush()
+        if rooms:
+            await self.db.execute(insert(MessageArchiveChatroom), [
+                {"archive_id": archive.id, "chatroom_id": chatroom_id, "min_id": min_id, "max_id": max_id, "message_count": count}
+                for chatroom_id, (min_id, max_id, count) in rooms.items()
+            ])
+        await self.db.commit()
+        return archive
+
+    async def _detach_partition(self, name: str):
+        # DETACH ... CONCURRENTLY cannot run inside a transaction block, as with
+        # the concurrent index build in migration 0006.
+        async with self.db.bind.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            pending = await conn.scalar(text(
+                "SELECT i.inhdetachpending FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE c.relname = :name AND c.relnamespace = current_schema()::regnamespace"
+            ), {"name": name})
+            if pending is not None:
+                # FINALIZE completes a concurrent detach that an earlier run was cut off in.
+                mode = "FINALIZE" if pending else "CONCURRENTLY"
+                await conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name} {mode}"))
+            await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+
+    async def _invalidate_ranges(self, chatroom_ids: List[int]):
+        for chatroom_id in chatroom_ids:
+            await invalidate_cache(archive_range_key(chatroom_id))
+
+    async def get_archive_range(self, chatroom_id: int) -> Optional[Tuple[int, int]]:
+        # (lowest, highest) archived message id for the room, or None when
+        # nothing of it is archived. Cached, since it only changes when the
+        # archive job runs and that invalidates it; SQLite and unpartitioned
+        # databases never have archives, so they skip the lookup entirely.
+        if not settings.MESSAGE_ARCHIVE_ENABLED or self.db.bind.dialect.name != "postgresql":
+            return None
+
+        async def load_range() -> list:
+            lowest, highest = (await self.db.execute(
+                select(func.min(MessageArchiveChatroom.min_id), func.max(MessageArchiveChatroom.max_id))
+                .where(MessageArchiveChatroom.chatroom_id == chatroom_id)
+            )).one()
+            return [lowest, highest] if lowest is not None else []
+
+        bounds = await get_or_set(archive_range_key(chatroom_id), load_range, ttl=3600)
+        return (bounds[0], bounds[1]) if bounds else None
+
+    async def list_chatroom_archives(self, chatroom_id: int) -> List[str]:
+        # Oldest first; archived ids are all below the rows still in Postgres.
+        if not settings.MESSAGE_ARCHIVE_ENABLED:
+            return []
+        stmt = (
+            select(MessageArchive.path)
+            .join(MessageArchiveChatroom, MessageArchiveChatroom.archive_id == MessageArchive.id)
+            .where(MessageArchiveChatroom.chatroom_id == chatroom_id)
+            .order_by(MessageArchiveChatroom.min_id.asc())
+        )
+        return list((await self.db.execute(stmt)).scalars().all())
+
+    async def get_messages(
+        self,
+        chatroom_id: int,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        limit: int = 50
+    ) -> List[Message]:
+        # Newest first when paging back, oldest first with after, matching
+        # ChatroomService.get_messages before it reverses the page.
+        if not settings.MESSAGE_ARCHIVE_ENABLED:
+            return []
+        stmt = (
+            select(MessageArchive.path)
+            .join(MessageArchiveChatroom, MessageArchiveChatroom.archive_id == MessageArchive.id)
+            .where(MessageArchiveChatroom.chatroom_id == chatroom_id)
+        )
+        if after is not None:
+            stmt = stmt.where(MessageArchiveChatroom.max_id > after).order_by(MessageArchiveChatroom.min_id.asc())
+        else:
+            if before is not None:
+                stmt = stmt.where(MessageArchiveChatroom.min_id < before)
+            stmt = stmt.order_by(MessageArchiveChatroom.max_id.desc())
+        files = (await self.db.execute(stmt)).scalars().all()
+
+        loop = asyncio.get_running_loop()
+        rows: List[dict] = []
+        for file_name in files:
+            found = await loop.run_in_executor(None, read_archived_rows, file_name, chatroom_id, before, after)
+            found.sort(key=lambda row: row["id"], reverse=after is None)
+            rows.extend(found[:limit - len(rows)])
+            if len(rows) >= limit:
+                break
+        return [Message(**row) for row in rows]
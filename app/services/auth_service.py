@@ -1,5 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends
+from app.core.config import settings
 from app.core.security import create_access_token
 from app.schemas.auth import UserRegister, SendOTPRequest, VerifyOTPRequest, PasswordChange, ForgotPasswordRequest, ResetPasswordRequest, Token
 from app.db.models import User
@@ -30,7 +31,10 @@ class AuthService:
         if not user:
             raise InvalidCredentialsException()
 
-        access_token = create_access_token(data={"sub": str(user.id)})
+        claims = {"sub": str(user.id)}
+        if settings.JWT_ROLE_CLAIMS:
+            claims["role"] = user.role
+        access_token = create_access_token(data=claims)
         return Token(access_token=access_token)
 
     async def forgot_password_send_otp(self, request: ForgotPasswordRequest) -> str:
@@ -1,12 +1,33 @@
+import html
+from sqlalchemy import and_, func, insert, literal, or_, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
-from app.db.models import Chatroom, Message, User
-from app.schemas.chatroom import ChatroomCreate, MessageCreate
+from app.core.config import settings
+from app.db.models import Chatroom, Message
+from app.schemas.chatroom import ChatroomCreate
 from app.core.exceptions import ChatroomNotFoundException
-from typing import List, Optional
+from app.services.archive_service import ArchiveService
+from app.services.context_service import ContextService
+from app.utils.cache import invalidate_cache
+from app.utils.chatroom_events import publish_message
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+# ts_headline copies the document around its StartSel/StopSel markers verbatim,
+# so message text (including AI replies) could smuggle markup into a highlight
+# rendered as HTML. It marks matches with private-use characters instead; the
+# text is escaped and only then are the markers turned into <mark> tags.
+_HIGHLIGHT_START = "\ue000"
+_HIGHLIGHT_STOP = "\ue001"
+
+def render_highlight(headline: str) -> str:
+    return html.escape(headline).replace(_HIGHLIGHT_START, "<mark>").replace(_HIGHLIGHT_STOP, "</mark>")
+
+def chatroom_list_key(user_id: int) -> str:
+    # Versioned: the cached value is the serialized page, so bump this whenever
+    # ChatroomPage changes shape or old bodies would be served until they expire.
+    return f"chatrooms_v2_user_{user_id}"
+
 class ChatroomService:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -18,21 +39,219 @@ class ChatroomService:
         await self.db.refresh(new_chatroom)
         return new_chatroom
 
-    async def get_user_chatrooms(self, user_id: int) -> List[Chatroom]:
-        stmt = select(Chatroom).where(Chatroom.user_id == user_id).order_by(Chatroom.created_at.desc())
+    async def get_user_chatrooms(
+        self,
+        user_id: int,
+        before: Optional[Tuple[datetime, int]] = None,
+        limit: int = 50
+    ) -> Tuple[List[Chatroom], bool]:
+        # Most recently active first; (last_message_at, id) is the keyset and
+        # matches ix_chatrooms_user_id_last_message_at.
+        stmt = select(Chatroom).where(Chatroom.user_id == user_id)
+        if before is not None:
+            stmt = stmt.where(tuple_(Chatroom.last_message_at, Chatroom.id) < tuple_(*before))
+        stmt = stmt.order_by(Chatroom.last_message_at.desc(), Chatroom.id.desc()).limit(limit + 1)
         result = await self.db.execute(stmt)
-        return result.scalars().all()
+        chatrooms = list(result.scalars().all())
+        return chatrooms[:limit], len(chatrooms) > limit
 
     async def get_chatroom_by_id(self, chatroom_id: int, user_id: int) -> Chatroom  :
-        stmt = select(Chatroom).options(selectinload(Chatroom.messages)).where(
-            Chatroom.id == chatroom_id, Chatroom.user_id == user_id
-        )
+        stmt = select(Chatroom).where(Chatroom.id == chatroom_id, Chatroom.user_id == user_id)
         result = await self.db.execute(stmt)
         return result.scalars().first()
 
+    async def get_messages(
+        self,
+        chatroom_id: int,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        limit: int = 50
+    ) -> Tuple[List[Message], bool]:
+        stmt = select(Message).where(Message.chatroom_id == chatroom_id)
+        if after is not None:
+            stmt = stmt.where(Message.id > after).order_by(Message.id.asc())
+        else:
+            if before is not None:
+                stmt = stmt.where(Message.id < before)
+            stmt = stmt.order_by(Message.id.desc())
+        result = await self.db.execute(stmt.limit(limit + 1))
+        messages = list(result.scalars().all())
+
+        # Archived months hold ids below everything still in Postgres. They are
+        # only read when the room has archives in range: ahead of the hot rows
+        # when paging forward from an archived id, and when paging back runs
+        # out of rows. While a partition is being archived its rows are in both
+        # places, so a forward page is merged by id.
+        archive_service = ArchiveService(self.db)
+        archive_range = await archive_service.get_archive_range(chatroom_id)
+        if archive_range is not None:
+            lowest, highest = archive_range
+            if after is not None and after < highest:
+                archived = await archive_service.get_messages(chatroom_id, after=after, limit=limit + 1)
+                merged = {message.id: message for message in archived + messages}
+                messages = sorted(merged.values(), key=lambda message: message.id)[:limit + 1]
+            elif after is None and len(messages) <= limit:
+                oldest = messages[-1].id if messages else before
+                if oldest is None or oldest > lowest:
+                    messages += await archive_service.get_messages(chatroom_id, before=oldest, limit=limit + 1 - len(messages))
+
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if after is None:
+            messages.reverse()
+        return messages, has_more
+
+    def _touch_chatroom(self, chatroom_id: int, content: str, user_id: Optional[int]):
+        # A single UPDATE, so concurrent senders cannot lose a count or leave a
+        # stale preview. With user_id it doubles as the ownership check.
+        stmt = update(Chatroom).where(Chatroom.id == chatroom_id)
+        if user_id is not None:
+            stmt = stmt.where(Chatroom.user_id == user_id)
+        return stmt.values(
+            last_message_at=func.now(),
+            last_message_preview=content[:settings.CHATROOM_PREVIEW_LENGTH],
+            message_count=Chatroom.message_count + 1,
+        ).returning(Chatroom.id, Chatroom.user_id, Chatroom.summary, Chatroom.summary_message_id)
+
+    async def _append_message(self, chatroom_id: int, sender: str, content: str, user_id: Optional[int] = None):
+        # Writes the message and the room's activity columns without committing.
+        # Returns (message, room row), or None when the room does not exist or
+        # does not belong to user_id, in which case nothing was written.
+        room_update = self._touch_chatroom(chatroom_id, content, user_id)
+        message_columns = (Message.id, Message.chatroom_id, Message.sender, Message.content, Message.sent_at)
+
+        if self.db.bind.dialect.name == "postgresql":
+            # UPDATE ... RETURNING feeds INSERT ... SELECT in one statement: the
+            # insert only happens if the room matched, and it is one round trip.
+            room = room_update.cte("room")
+            inserted = (
+                insert(Message)
+                .from_select(
+                    ["chatroom_id", "sender", "content", "search_vector"],
+                    select(
+                        room.c.id,
+                        literal(sender),
+                        literal(content),
+                        func.to_tsvector(settings.SEARCH_TEXT_CONFIG, literal(content)),
+                    )
+                )
+                .returning(*message_columns)
+                .cte("inserted")
+            )
+            stmt = select(
+                inserted.c.id,
+                inserted.c.chatroom_id,
+                inserted.c.sender,
+                inserted.c.content,
+                inserted.c.sent_at,
+                room.c.user_id,
+                room.c.summary,
+                room.c.summary_message_id,
+            ).join_from(inserted, room, inserted.c.chatroom_id == room.c.id)
+            row = (await self.db.execute(stmt)).first()
+            if row is None:
+                return None
+            room_row = row
+        else:
+            room_row = (await self.db.execute(room_update)).first()
+            if room_row is None:
+                return None
+            row = (await self.db.execute(
+                insert(Message)
+                .values(chatroom_id=chatroom_id, sender=sender, content=content)
+                .returning(*message_columns)
+            )).first()
+
+        message = Message(id=row.id, chatroom_id=row.chatroom_id, sender=row.sender, content=row.content, sent_at=row.sent_at)
+        return message, room_row
+
+    async def _message_committed(self, message: Message, user_id: Optional[int]):
+        # The message is already committed; cache and fan-out failures are
+        # logged rather than surfaced to the sender.
+        try:
+            await publish_message(message)
+        except Exception as e:
+            print(f"Failed to publish message {message.id} for chatroom {message.chatroom_id}: {e}")
+        if user_id is None:
+            return
+        try:
+            await invalidate_cache(chatroom_list_key(user_id))
+        except Exception as e:
+            print(f"Failed to invalidate chatroom list for user {user_id}: {e}")
+
     async def add_message_to_chatroom(self, chatroom_id: int, sender: str, content: str) -> Message:
-        new_message = Message(chatroom_id=chatroom_id, sender=sender, content=content)
-        self.db.add(new_message)
+        appended = await self._append_message(chatroom_id, sender, content)
+        if appended is None:
+            raise ChatroomNotFoundException()
+        message, room = appended
         await self.db.commit()
-        await self.db.refresh(new_message)
-        return new_message
\ No newline at end of file
+        await self._message_committed(message, room.user_id)
+        return message
+
+    async def send_user_message(self, chatroom_id: int, user_id: int, content: str) -> Tuple[Message, List[Dict[str, str]]]:
+        # The send path in one transaction: the ownership check, activity
+        # update and insert are one statement, the history read is a second,
+        # then a single commit.
+        appended = await self._append_message(chatroom_id, "user", content, user_id=user_id)
+        if appended is None:
+            raise ChatroomNotFoundException()
+        message, room = appended
+        chat_history = await ContextService(self.db).build_chat_history(room, content, before_id=message.id)
+        await self.db.commit()
+        await self._message_committed(message, user_id)
+        return message, chat_history
+
+    async def search_messages(
+        self,
+        user_id: int,
+        query: str,
+        cursor: Optional[Tuple[float, int]] = None,
+        limit: int = 20
+    ) -> Tuple[list, bool]:
+        # Ranked by relevance, newest first within a rank; the cursor is the
+        # (rank, id) of the last row already returned.
+        ts_query = func.websearch_to_tsquery(settings.SEARCH_TEXT_CONFIG, query)
+        rank = func.ts_rank(Message.search_vector, ts_query)
+        stmt = (
+            select(
+                Message.id,
+                Message.chatroom_id,
+                Message.sender,
+                Message.content,
+                Message.sent_at,
+                rank.label("rank"),
+            )
+            .where(
+                Message.chatroom_id.in_(select(Chatroom.id).where(Chatroom.user_id == user_id)),
+                Message.search_vector.op("@@")(ts_query),
+            )
+        )
+        if cursor is not None:
+            last_rank, last_id = cursor
+            stmt = stmt.where(or_(rank < last_rank, and_(rank == last_rank, Message.id < last_id)))
+        page = stmt.order_by(rank.desc(), Message.id.desc()).limit(limit + 1).subquery()
+
+        # ts_headline re-parses the document, so it only runs on the page's rows.
+        highlight = func.ts_headline(
+            settings.SEARCH_TEXT_CONFIG,
+            # Markers typed into a message would open or close a <mark>; drop them.
+            func.translate(page.c.content, _HIGHLIGHT_START + _HIGHLIGHT_STOP, ""),
+            ts_query,
+            f"StartSel={_HIGHLIGHT_START}, StopSel={_HIGHLIGHT_STOP}, MaxFragments=2, MaxWords=20, MinWords=5",
+        )
+        stmt = (
+            select(
+                page.c.id,
+                page.c.chatroom_id,
+                Chatroom.name.label("chatroom_name"),
+                page.c.sender,
+                page.c.sent_at,
+                page.c.rank,
+                highlight.label("highlight"),
+            )
+            .join(Chatroom, Chatroom.id == page.c.chatroom_id)
+            .order_by(page.c.rank.desc(), page.c.id.desc())
+        )
+        rows = (await self.db.execute(stmt)).mappings().all()
+        results = [{**row, "highlight": render_highlight(row["highlight"])} for row in rows[:limit]]
+        return results, len(rows) > limit
\ No newline at end of file
@@ -0,0 +1,85 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.db.models import Chatroom, Message
+from app.core.config import settings
+from typing import Dict, List, Optional
+
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+class ContextService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _select_recent_messages(self, chatroom_id: int, after_id: Optional[int], budget: int, before_id: Optional[int] = None) -> list:
+        stmt = select(Message.id, Message.sender, Message.content).where(Message.chatroom_id == chatroom_id)
+        if after_id is not None:
+            stmt = stmt.where(Message.id > after_id)
+        if before_id is not None:
+            stmt = stmt.where(Message.id < before_id)
+        stmt = stmt.order_by(Message.id.desc()).limit(settings.GEMINI_CONTEXT_MAX_MESSAGES)
+        result = await self.db.execute(stmt)
+
+        selected = []
+        for row in result.all():
+            cost = estimate_tokens(row.content)
+            if cost > budget:
+                break
+            budget -= cost
+            selected.append(row)
+        selected.reverse()
+
+        # Gemini expects the history to open with a user turn.
+        while selected and selected[0].sender != "user":
+            selected.pop(0)
+        return selected
+
+    async def build_chat_history(self, chatroom: Chatroom, prompt: str, before_id: Optional[int] = None) -> List[Dict[str, str]]:
+        # chatroom only needs id, summary and summary_message_id, so a row
+        # returned by the send statement works as well as a loaded Chatroom.
+        budget = settings.GEMINI_CONTEXT_TOKEN_BUDGET - estimate_tokens(prompt)
+        summary = chatroom.summary if settings.GEMINI_SUMMARY_ENABLED else None
+        after_id = None
+        if summary:
+            budget -= estimate_tokens(summary)
+            after_id = chatroom.summary_message_id
+
+        chat_history = []
+        if summary:
+            chat_history.append({"role": "user", "content": f"Summary of our conversation so far: {summary}"})
+            chat_history.append({"role": "ai", "content": "Understood, I'll keep that context in mind."})
+        for msg in await self._select_recent_messages(chatroom.id, after_id, max(budget, 0), before_id):
+            chat_history.append({"role": msg.sender, "content": msg.content})
+        return chat_history
+
+    async def refresh_summary(self, chatroom_id: int, gemini_service) -> Optional[Chatroom]:
+        chatroom = await self.db.get(Chatroom, chatroom_id)
+        if not chatroom:
+            return None
+
+        budget = settings.GEMINI_CONTEXT_TOKEN_BUDGET - (estimate_tokens(chatroom.summary) if chatroom.summary else 0)
+        window = await self._select_recent_messages(chatroom_id, chatroom.summary_message_id, max(budget, 0))
+        if not window:
+            return chatroom
+
+        stmt = select(Message.id, Message.sender, Message.content).where(
+            Message.chatroom_id == chatroom_id,
+            Message.id < window[0].id
+        )
+        if chatroom.summary_message_id is not None:
+            stmt = stmt.where(Message.id > chatroom.summary_message_id)
+        stmt = stmt.order_by(Message.id.asc()).limit(settings.GEMINI_SUMMARY_BATCH_SIZE)
+        result = await self.db.execute(stmt)
+        stale_messages = result.all()
+        if len(stale_messages) < settings.GEMINI_SUMMARY_MIN_MESSAGES:
+            return chatroom
+
+        chatroom.summary = await gemini_service.summarize_conversation(
+            chatroom.summary,
+            [{"role": m.sender, "content": m.content} for m in stale_messages]
+        )
+        chatroom.summary_message_id = stale_messages[-1].id
+        await self.db.commit()
+        return chatroom
@@ -0,0 +1,118 @@
+import asyncio
+import zlib
+from typing import AsyncIterator, Iterable, List
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.db.models import Chatroom, Message
+from app.services.archive_service import ArchiveService, iter_archived_batches
+
+# Exports are NDJSON: a {"type": "chatroom"} line per room followed by its
+# {"type": "message"} lines, oldest first. Rows are pulled in batches through
+# server-side cursors and archived files are read batch by batch, so memory
+# stays flat however long the history is.
+
+MESSAGE_COLUMNS = (Message.id, Message.chatroom_id, Message.sender, Message.content, Message.sent_at)
+
+def _chatroom_line(chatroom) -> bytes:
+    return orjson.dumps({
+        "type": "chatroom",
+        "id": chatroom.id,
+        "name": chatroom.name,
+        "created_at": chatroom.created_at,
+    }) + b"\n"
+
+def _message_lines(rows: Iterable) -> bytes:
+    return b"".join(
+        orjson.dumps({
+            "type": "message",
+            "id": row["id"],
+            "chatroom_id": row["chatroom_id"],
+            "sender": row["sender"],
+            "content": row["content"],
+            "sent_at": row["sent_at"],
+        }) + b"\n"
+        for row in rows
+    )
+
+def export_media_type(gzip: bool) -> str:
+    return "application/gzip" if gzip else "application/x-ndjson"
+
+def export_headers(name: str, gzip: bool) -> dict:
+    filename = f"{name}.ndjson.gz" if gzip else f"{name}.ndjson"
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+async def _coalesce(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # Fewer, larger writes; each yield waits until the consumer took the
+    # previous chunk, which is what applies backpressure to the cursors.
+    buffer: List[bytes] = []
+    size = 0
+    async for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= settings.EXPORT_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+class ExportService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _archived_lines(self, chatroom_id: int) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        for file_name in await ArchiveService(self.db).list_chatroom_archives(chatroom_id):
+            batches = iter_archived_batches(file_name, chatroom_id, settings.EXPORT_BATCH_SIZE)
+            while True:
+                batch = await loop.run_in_executor(None, next, batches, None)
+                if batch is None:
+                    break
+                yield _message_lines(batch)
+
+    async def _chatroom_lines(self, chatroom) -> AsyncIterator[bytes]:
+        yield _chatroom_line(chatroom)
+        async for chunk in self._archived_lines(chatroom.id):
+            yield chunk
+
+        result = await self.db.stream(
+            select(*MESSAGE_COLUMNS)
+            .where(Message.chatroom_id == chatroom.id)
+            .order_by(Message.id.asc())
+            .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.mappings().partitions():
+            yield _message_lines(rows)
+
+    async def export_chatroom(self, chatroom_id: int, gzip: bool = False) -> AsyncIterator[bytes]:
+        chatroom = await self.db.get(Chatroom, chatroom_id)
+        chunks = _coalesce(self._chatroom_lines(chatroom))
+        async for chunk in (gzip_chunks(chunks) if gzip else chunks):
+            yield chunk
+
+    async def _user_lines(self, user_id: int) -> AsyncIterator[bytes]:
+        # Room rows are few and small; only messages need a cursor.
+        result = await self.db.execute(
+            select(Chatroom.id, Chatroom.name, Chatroom.created_at)
+            .where(Chatroom.user_id == user_id)
+            .order_by(Chatroom.id.asc())
+        )
+        for chatroom in result.all():
+            async for chunk in self._chatroom_lines(chatroom):
+                yield chunk
+
+    async def export_user(self, user_id: int, gzip: bool = False) -> AsyncIterator[bytes]:
+        chunks = _coalesce(self._user_lines(user_id))
+        async for chunk in (gzip_chunks(chunks) if gzip else chunks):
+            yield chunk
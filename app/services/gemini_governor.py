@@ -0,0 +1,218 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+THROTTLE_STATUS_CODES = {429, 503}
+
+class GeminiUnavailableError(Exception):
+    pass
+
+class CircuitOpenError(GeminiUnavailableError):
+    pass
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    # google.api_core exceptions expose the HTTP status as ``code``.
+    code = getattr(exc, "code", None)
+    return code if isinstance(code, int) else None
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return _status_code(exc) in RETRYABLE_STATUS_CODES
+
+def is_throttle(exc: BaseException) -> bool:
+    return isinstance(exc, asyncio.TimeoutError) or _status_code(exc) in THROTTLE_STATUS_CODES
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        while not self.try_acquire():
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AdaptiveConcurrencyLimiter:
+    # Additive increase on success, multiplicative decrease when the provider
+    # pushes back, so the limit tracks what Gemini is currently willing to serve.
+    def __init__(self, initial: int, min_limit: int, max_limit: int, decrease_factor: float = 0.5):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < max(int(self.limit), self.min_limit))
+            self.in_flight += 1
+
+    async def release(self, throttled: bool = False, succeeded: bool = False):
+        async with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            elif succeeded:
+                self.limit = min(self.max_limit, self.limit + 1 / max(self.limit, 1))
+            self._condition.notify_all()
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return self.state != self.OPEN
+
+    def release_probe(self):
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+class GeminiGovernor:
+    def __init__(self):
+        self.bucket = TokenBucket(settings.GEMINI_REQUESTS_PER_SECOND, settings.GEMINI_BURST)
+        self.limiter = AdaptiveConcurrencyLimiter(
+            settings.GEMINI_CONCURRENCY_INITIAL,
+            settings.GEMINI_CONCURRENCY_MIN,
+            settings.GEMINI_CONCURRENCY_MAX
+        )
+        self.breaker = CircuitBreaker(settings.GEMINI_BREAKER_FAILURE_THRESHOLD, settings.GEMINI_BREAKER_RESET_SECONDS)
+
+    @asynccontextmanager
+    async def slot(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError("Gemini circuit breaker is open")
+        try:
+            await self.bucket.acquire()
+            await self.limiter.acquire()
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        try:
+            yield
+        except Exception as e:
+            if is_retryable(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            await self.limiter.release(throttled=is_throttle(e))
+            raise
+        except BaseException:
+            self.breaker.release_probe()
+            await self.limiter.release()
+            raise
+        else:
+            self.breaker.record_success()
+            await self.limiter.release(succeeded=True)
+
+    async def _hedged(self, factory: Callable[[], Awaitable[T]], timeout: float) -> T:
+        # Fire a second identical request if the first is slow, and take whichever
+        # finishes first. Hedges spend rate-limit tokens, so none is sent when the
+        # bucket is empty.
+        deadline = time.monotonic() + timeout
+        tasks = [asyncio.ensure_future(factory())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=min(settings.GEMINI_HEDGE_DELAY_SECONDS, timeout))
+            if not done and self.bucket.try_acquire():
+                tasks.append(asyncio.ensure_future(factory()))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                remaining = deadline - time.monotonic()
+                done, pending = await asyncio.wait(pending, timeout=max(remaining, 0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(self, factory: Callable[[], Awaitable[T]]) -> T:
+        # ``factory`` must build a fresh request each time: it is invoked once per
+        # attempt and, with hedging, twice concurrently.
+        deadline = time.monotonic() + settings.GEMINI_DEADLINE_SECONDS
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise GeminiUnavailableError("Gemini deadline exceeded")
+            timeout = min(settings.GEMINI_REQUEST_TIMEOUT_SECONDS, remaining)
+            try:
+                async with self.slot():
+                    if settings.GEMINI_HEDGE_ENABLED:
+                        return await self._hedged(factory, timeout)
+                    return await asyncio.wait_for(factory(), timeout)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if attempt >= settings.GEMINI_MAX_RETRIES:
+                    raise GeminiUnavailableError(f"Gemini request failed after {attempt + 1} attempts: {e}") from e
+
+            # Full jitter keeps retrying workers from synchronising.
+            backoff = min(settings.GEMINI_RETRY_MAX_DELAY_SECONDS, settings.GEMINI_RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+            await asyncio.sleep(min(random.uniform(0, backoff), max(deadline - time.monotonic(), 0)))
+            attempt += 1
+
+_governors: Dict[str, GeminiGovernor] = {}
+
+def get_governor(api_key: Optional[str] = None) -> GeminiGovernor:
+    key = api_key or settings.GEMINI_API_KEY or ""
+    governor = _governors.get(key)
+    if governor is None:
+        governor = _governors[key] = GeminiGovernor()
+    return governor
@@ -0,0 +1,67 @@
+import hashlib
+import time
+from typing import Dict, List, Optional
+
+import orjson
+
+from app.core.config import settings
+from app.core.metrics import record_cache
+from app.utils.cache import get_redis_client
+
+INDEX_KEY = "gemini_response_cache:index"
+
+# KEYS: entry, index; ARGV: value, ttl, now, max entries
+# The index is a sorted set of entry keys by insertion time, used to cap the
+# number of entries independently of Redis' own eviction policy.
+SET_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', tonumber(ARGV[3]) - tonumber(ARGV[2]))
+redis.call('ZADD', KEYS[2], ARGV[3], KEYS[1])
+local excess = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[4])
+if excess > 0 then
+    local evicted = redis.call('ZRANGE', KEYS[2], 0, excess - 1)
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, excess - 1)
+    for _, key in ipairs(evicted) do
+        redis.call('DEL', key)
+    end
+end
+return 1
+"""
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+def response_cache_key(model_name: str, generation_config: dict, chat_history: List[Dict[str, str]], prompt: str) -> str:
+    payload = orjson.dumps(
+        {
+            "model": model_name,
+            "config": generation_config,
+            "history": [[msg["role"], _normalize(msg["content"])] for msg in chat_history],
+            "prompt": _normalize(prompt),
+        },
+        option=orjson.OPT_SORT_KEYS
+    )
+    return f"gemini_response:{hashlib.sha256(payload).hexdigest()}"
+
+async def get_cached_response(key: str) -> Optional[str]:
+    redis_client = await get_redis_client()
+    value = await redis_client.get(key)
+    if value is None:
+        record_cache(key, "miss")
+        return None
+    record_cache(key, "hit")
+    return value.decode()
+
+async def cache_response(key: str, text: str):
+    value = text.encode()
+    if len(value) > settings.GEMINI_RESPONSE_CACHE_MAX_BYTES:
+        record_cache(key, "bypass")
+        return
+    redis_client = await get_redis_client()
+    await redis_client.eval(
+        SET_SCRIPT, 2, key, INDEX_KEY,
+        value,
+        settings.GEMINI_RESPONSE_CACHE_TTL_SECONDS,
+        int(time.time()),
+        settings.GEMINI_RESPONSE_CACHE_MAX_ENTRIES
+    )
@@ -1,21 +1,145 @@
-import google.generativeai as genai
+import asyncio
+import time
 from app.core.config import settings
-from typing import List, Dict
+from app.core.metrics import GEMINI_ERRORS, GEMINI_FIRST_CHUNK_DURATION, GEMINI_REQUEST_DURATION, GEMINI_TOKENS
+from app.services.gemini_governor import get_governor
+from app.services.gemini_response_cache import response_cache_key, get_cached_response, cache_response
+from typing import AsyncIterator, List, Dict, Optional
 
 class GeminiService:
     def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-pro')
+        # Imported here rather than at module level: the SDK is slow to import
+        # and most processes only need it once the first AI message arrives.
+        import google.generativeai as genai
+
+        if settings.GEMINI_API_ENDPOINT:
+            genai.configure(
+                api_key=settings.GEMINI_API_KEY,
+                transport="rest",
+                client_options={"api_endpoint": settings.GEMINI_API_ENDPOINT}
+            )
+        else:
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+        self.model_name = settings.GEMINI_MODEL_NAME
+        self.generation_config = settings.GEMINI_GENERATION_CONFIG
+        self.model = genai.GenerativeModel(self.model_name, generation_config=self.generation_config or None)
+
+    def _start_chat(self, chat_history: List[Dict[str, str]]):
+        formatted_history = []
+        for msg in chat_history:
+            role = "model" if msg['role'] == "ai" else msg['role']
+            formatted_history.append({'role': role, 'parts': [msg['content']]})
+        return self.model.start_chat(history=formatted_history)
+
+    def _cache_key(self, prompt: str, chat_history: List[Dict[str, str]]) -> Optional[str]:
+        if not settings.GEMINI_RESPONSE_CACHE_ENABLED:
+            return None
+        return response_cache_key(self.model_name, self.generation_config, chat_history, prompt)
+
+    async def _get_cached(self, cache_key: Optional[str]) -> Optional[str]:
+        if cache_key is None:
+            return None
+        try:
+            return await get_cached_response(cache_key)
+        except Exception as e:
+            print(f"Gemini response cache read failed: {e}")
+            return None
+
+    async def _store_cached(self, cache_key: Optional[str], text: str):
+        if cache_key is None or not text:
+            return
+        try:
+            await cache_response(cache_key, text)
+        except Exception as e:
+            print(f"Gemini response cache write failed: {e}")
+
+    def _record_usage(self, method: str, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        GEMINI_TOKENS.labels(method, "prompt").observe(usage.prompt_token_count or 0)
+        GEMINI_TOKENS.labels(method, "completion").observe(usage.candidates_token_count or 0)
+
+    def _record_failure(self, method: str, started: float, error: BaseException):
+        GEMINI_REQUEST_DURATION.labels(method, "error").observe(time.perf_counter() - started)
+        GEMINI_ERRORS.labels(method, type(error).__name__).inc()
 
     async def get_gemini_response(self, prompt: str, chat_history: List[Dict[str, str]]) -> str:
+        started = time.perf_counter()
+        cache_key = self._cache_key(prompt, chat_history)
+        cached = await self._get_cached(cache_key)
+        if cached is not None:
+            GEMINI_REQUEST_DURATION.labels("generate", "cached").observe(time.perf_counter() - started)
+            return cached
+
+        # A fresh chat session per attempt: retries and hedged requests must not
+        # share the SDK's mutable history.
+        try:
+            response = await get_governor(settings.GEMINI_API_KEY).call(
+                lambda: self._start_chat(chat_history).send_message_async(prompt)
+            )
+        except Exception as e:
+            self._record_failure("generate", started, e)
+            raise
+        GEMINI_REQUEST_DURATION.labels("generate", "ok").observe(time.perf_counter() - started)
+        self._record_usage("generate", response)
+        await self._store_cached(cache_key, response.text)
+        return response.text
+
+    async def stream_gemini_response(self, prompt: str, chat_history: List[Dict[str, str]]) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        cache_key = self._cache_key(prompt, chat_history)
+        cached = await self._get_cached(cache_key)
+        if cached is not None:
+            GEMINI_REQUEST_DURATION.labels("stream", "cached").observe(time.perf_counter() - started)
+            yield cached
+            return
+
+        chunks = []
         try:
-            formatted_history = []
-            for msg in chat_history:
-                formatted_history.append({'role': msg['role'], 'parts': [msg['content']]})
+            async with get_governor(settings.GEMINI_API_KEY).slot():
+                convo = self._start_chat(chat_history)
+                response = await asyncio.wait_for(
+                    convo.send_message_async(prompt, stream=True),
+                    settings.GEMINI_REQUEST_TIMEOUT_SECONDS
+                )
+                async for chunk in response:
+                    if chunk.text:
+                        if not chunks:
+                            GEMINI_FIRST_CHUNK_DURATION.observe(time.perf_counter() - started)
+                        chunks.append(chunk.text)
+                        yield chunk.text
+        except Exception as e:
+            self._record_failure("stream", started, e)
+            raise
+        GEMINI_REQUEST_DURATION.labels("stream", "ok").observe(time.perf_counter() - started)
+        self._record_usage("stream", response)
+        await self._store_cached(cache_key, "".join(chunks))
 
-            convo = self.model.start_chat(history=formatted_history)
-            response = await convo.send_message_async(prompt)
-            return response.text
+    async def summarize_conversation(self, previous_summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        prompt = (
+            "Update the running summary of a conversation between a user and an AI assistant. "
+            "Keep names, facts, decisions and open questions; stay under 200 words.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        started = time.perf_counter()
+        try:
+            response = await get_governor(settings.GEMINI_API_KEY).call(
+                lambda: self.model.generate_content_async(prompt)
+            )
         except Exception as e:
-            print(f"Gemini API error: {e}")
-            return "Sorry, I'm unable to generate a response at the moment."
\ No newline at end of file
+            self._record_failure("summarize", started, e)
+            raise
+        GEMINI_REQUEST_DURATION.labels("summarize", "ok").observe(time.perf_counter() - started)
+        self._record_usage("summarize", response)
+        return response.text
+
+_gemini_service: Optional[GeminiService] = None
+
+def get_gemini_service() -> GeminiService:
+    global _gemini_service
+    if _gemini_service is None:
+        _gemini_service = GeminiService()
+    return _gemini_service
\ No newline at end of file
@@ -1,18 +1,47 @@
-import stripe
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from app.core.config import settings
-from app.db.models import User, Subscription, UserRole
+from app.db.dialects import insert
+from app.db.models import User, Subscription, StripeEvent, UserRole
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from app.core.exceptions import PaymentProcessingError
+from sqlalchemy import update
+from app.core.exceptions import InvalidWebhookException, PaymentProcessingError
+from app.utils.user_cache import invalidate_user
+from app.utils.subscription_cache import subscription_state, store_subscription_state
 from datetime import datetime
+from typing import Optional
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+_stripe = None
+
+def get_stripe():
+    # The SDK is imported on first use so it stays off the startup path.
+    global _stripe
+    if _stripe is None:
+        import stripe
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+        stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+        if settings.STRIPE_API_BASE:
+            stripe.api_base = settings.STRIPE_API_BASE
+        # RequestsClient keeps a session per thread, so pool threads reuse their connections.
+        stripe.default_http_client = stripe.RequestsClient(timeout=settings.STRIPE_TIMEOUT_SECONDS)
+        _stripe = stripe
+    return _stripe
+
+_stripe_executor = ThreadPoolExecutor(max_workers=settings.STRIPE_MAX_WORKERS, thread_name_prefix="stripe")
+
+async def _stripe_call(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_stripe_executor, partial(func, *args, **kwargs))
 
 class PaymentService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
     async def create_stripe_checkout_session(self, user: User) -> str:
+        stripe = get_stripe()
         try:
             
             user_subscription = await self._get_user_subscription(user.id)
@@ -20,7 +49,8 @@ class PaymentService:
 
             if not customer_id:
                 
-                customer = stripe.Customer.create(
+                customer = await _stripe_call(
+                    stripe.Customer.create,
                     email=f"{user.mobile_number}@example.com", 
                     metadata={"user_id": user.id}
                 )
@@ -34,7 +64,8 @@ class PaymentService:
                 await self.db.commit()
                 await self.db.refresh(user_subscription)
 
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = await _stripe_call(
+                stripe.checkout.Session.create,
                 customer=customer_id,
                 line_items=[
                     {
@@ -55,27 +86,103 @@ class PaymentService:
         except Exception as e:
             raise PaymentProcessingError(detail=f"An unexpected error occurred: {e}")
 
-    async def handle_stripe_webhook_event(self, event: stripe.Event):
+    async def record_webhook_event(self, payload: bytes, sig_header: str) -> Optional[str]:
+        # Verifies the signature and stores the event once per Stripe event id.
+        # Returns the id when the event still needs processing, None when it is
+        # a redelivery of one that was already handled.
+        stripe = get_stripe()
+        try:
+            event = stripe.Webhook.construct_event(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET)
+        except ValueError:
+            raise InvalidWebhookException(detail="Invalid payload")
+        except stripe.error.SignatureVerificationError:
+            raise InvalidWebhookException(detail="Invalid signature")
+
+        stmt = insert(StripeEvent).values(
+            id=event['id'],
+            type=event['type'],
+            payload=json.loads(payload),
+            status="pending",
+            attempts=0
+        ).on_conflict_do_nothing(index_elements=[StripeEvent.id]).returning(StripeEvent.id)
+        result = await self.db.execute(stmt)
+        inserted = result.scalar_one_or_none()
+        await self.db.commit()
+        if inserted:
+            return inserted
+
+        # A redelivery: only hand it to the worker again if the first attempt
+        # never finished, e.g. the enqueue failed after the row was written.
+        status = await self.db.scalar(select(StripeEvent.status).where(StripeEvent.id == event['id']))
+        return event['id'] if status != "processed" else None
+
+    async def process_webhook_event(self, event_id: str) -> bool:
+        # The row lock keeps two workers from applying the same event at once;
+        # the status check makes redelivered tasks a no-op.
+        stmt = select(StripeEvent).where(StripeEvent.id == event_id).with_for_update(skip_locked=True)
+        result = await self.db.execute(stmt)
+        record = result.scalars().first()
+        if not record or record.status == "processed":
+            await self.db.rollback()
+            return False
+
+        try:
+            user_id = await self.handle_stripe_webhook_event(record.payload)
+            record.status = "processed"
+            record.attempts = (record.attempts or 0) + 1
+            record.last_error = None
+            record.processed_at = datetime.utcnow()
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            await self.db.execute(
+                update(StripeEvent)
+                .where(StripeEvent.id == event_id)
+                .values(status="failed", attempts=StripeEvent.attempts + 1, last_error=str(e))
+            )
+            await self.db.commit()
+            raise
+
+        if user_id:
+            # The event is already committed as processed; a cache failure here
+            # must not make the task retry it.
+            try:
+                await invalidate_user(user_id)
+                await self._publish_subscription_state(user_id)
+            except Exception as e:
+                print(f"Failed to refresh cached subscription for user {user_id}: {e}")
+        return True
+
+    async def _publish_subscription_state(self, user_id: int):
+        # Write the committed state through so tier checks and status polls see
+        # it immediately instead of after the cache TTL.
+        subscription = await self._get_user_subscription(user_id)
+        role = await self.db.scalar(select(User.role).where(User.id == user_id))
+        await store_subscription_state(user_id, subscription_state(role, subscription))
+
+    async def handle_stripe_webhook_event(self, event: dict) -> Optional[int]:
+        # Applies the event without committing so the caller can record it as
+        # processed in the same transaction. Returns the user whose subscription changed.
+        stripe = get_stripe()
         event_type = event['type']
         data = event['data']['object']
 
         if event_type == 'checkout.session.completed':
             customer_id = data['customer']
             subscription_id = data.get('subscription')
-            user_id = data['metadata'].get('user_id')
+            user_id = (data.get('metadata') or {}).get('user_id')
 
             if user_id and subscription_id:
                 user_id = int(user_id)
+                stripe_subscription = await _stripe_call(stripe.Subscription.retrieve, subscription_id)
                 user_subscription = await self._get_user_subscription(user_id)
                 if user_subscription:
                     user_subscription.stripe_customer_id = customer_id
                     user_subscription.stripe_subscription_id = subscription_id
                     user_subscription.tier = UserRole.PRO.value
                     user_subscription.status = "active"
-                    
-                    stripe_subscription = stripe.Subscription.retrieve(subscription_id)
                     user_subscription.current_period_end = datetime.fromtimestamp(stripe_subscription.current_period_end)
-                    await self.db.commit()
+                    await self._set_user_role(user_id, UserRole.PRO.value)
                     print(f"User {user_id} subscribed to Pro tier.")
                 else:
                     
@@ -86,11 +193,11 @@ class PaymentService:
                         tier=UserRole.PRO.value,
                         status="active"
                     )
-                    stripe_subscription = stripe.Subscription.retrieve(subscription_id)
                     new_subscription.current_period_end = datetime.fromtimestamp(stripe_subscription.current_period_end)
                     self.db.add(new_subscription)
-                    await self.db.commit()
+                    await self._set_user_role(user_id, UserRole.PRO.value)
                     print(f"New subscription created for user {user_id} to Pro tier.")
+                return user_id
 
         elif event_type == 'invoice.payment_succeeded':
             
@@ -98,11 +205,11 @@ class PaymentService:
             if subscription_id:
                 user_subscription = await self._get_user_subscription_by_stripe_sub_id(subscription_id)
                 if user_subscription:
-                    stripe_subscription = stripe.Subscription.retrieve(subscription_id)
+                    stripe_subscription = await _stripe_call(stripe.Subscription.retrieve, subscription_id)
                     user_subscription.status = "active"
                     user_subscription.current_period_end = datetime.fromtimestamp(stripe_subscription.current_period_end)
-                    await self.db.commit()
                     print(f"Subscription {subscription_id} payment succeeded.")
+                    return user_subscription.user_id
 
         elif event_type == 'invoice.payment_failed' or event_type == 'customer.subscription.deleted':
             
@@ -112,9 +219,13 @@ class PaymentService:
                 if user_subscription:
                     user_subscription.status = "inactive" 
                     user_subscription.tier = UserRole.BASIC.value 
-                    await self.db.commit()
+                    await self._set_user_role(user_subscription.user_id, UserRole.BASIC.value)
                     print(f"Subscription {subscription_id} payment failed or cancelled. User {user_subscription.user_id} downgraded to Basic.")
-        
+                    return user_subscription.user_id
+        return None
+
+    async def _set_user_role(self, user_id: int, role: str):
+        await self.db.execute(update(User).where(User.id == user_id).values(role=role))
 
     async def get_user_subscription_status(self, user_id: int) -> Subscription  :
         return await self._get_user_subscription(user_id)
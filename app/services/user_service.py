@@ -2,11 +2,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.db.models import User, UserRole, Subscription
 from app.schemas.auth import UserRegister, PasswordChange, ResetPasswordRequest
-from app.core.security import get_password_hash, verify_password
+from app.core.security import hash_password_async, verify_password_async, verify_and_update_password_async
 from app.core.exceptions import UserAlreadyExistsException, InvalidCredentialsException
 from app.services.otp_service import OTPService
 from app.db.models import DailyUsage
-from datetime import datetime, date
+from app.utils.user_cache import invalidate_user
+from app.utils.token_revocation import revoke_user_tokens
+from datetime import datetime, date, time
+from typing import Optional
 
 class UserService:
     def __init__(self, db: AsyncSession):
@@ -23,7 +26,7 @@ class UserService:
         if existing_user:
             raise UserAlreadyExistsException()
 
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await hash_password_async(user_data.password)
         new_user = User(
             mobile_number=user_data.mobile_number,
             hashed_password=hashed_password,
@@ -42,18 +45,27 @@ class UserService:
 
     async def authenticate_user(self, mobile_number: str, password: str) -> User  :
         user = await self.get_user_by_mobile(mobile_number)
-        if not user or not verify_password(password, user.hashed_password):
+        if not user:
+            raise InvalidCredentialsException()
+        is_valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+        if not is_valid:
             raise InvalidCredentialsException()
+        if new_hash:
+            # Hash was made with outdated parameters (e.g. fewer bcrypt rounds); upgrade it transparently.
+            user.hashed_password = new_hash
+            await self.db.commit()
         return user
 
     async def change_password(self, user_id: int, password_change: PasswordChange) -> User:
         user = await self.db.get(User, user_id)
-        if not user or not verify_password(password_change.old_password, user.hashed_password):
+        if not user or not await verify_password_async(password_change.old_password, user.hashed_password):
             raise InvalidCredentialsException()
 
-        user.hashed_password = get_password_hash(password_change.new_password)
+        user.hashed_password = await hash_password_async(password_change.new_password)
         await self.db.commit()
         await self.db.refresh(user)
+        await invalidate_user(user.id)
+        await revoke_user_tokens(user.id)
         return user
 
     async def reset_password_with_otp(self, reset_request: ResetPasswordRequest) -> User:
@@ -65,28 +77,18 @@ class UserService:
         if not user:
             raise InvalidCredentialsException()
 
-        user.hashed_password = get_password_hash(reset_request.new_password)
+        user.hashed_password = await hash_password_async(reset_request.new_password)
         await self.db.commit()
         await self.db.refresh(user)
+        await invalidate_user(user.id)
+        await revoke_user_tokens(user.id)
         return user
 
-    async def get_daily_usage(self, user_id: int) -> DailyUsage:
-        today = datetime.utcnow().date()
+    async def get_daily_usage(self, user_id: int, day: Optional[date] = None) -> Optional[DailyUsage]:
+        day = day or datetime.utcnow().date()
         stmt = select(DailyUsage).where(
             DailyUsage.user_id == user_id,
-            func.date(DailyUsage.date) == today
+            DailyUsage.date == datetime.combine(day, time.min)
         )
         result = await self.db.execute(stmt)
-        usage = result.scalars().first()
-        if not usage:
-            usage = DailyUsage(user_id=user_id, date=today, prompt_count=0)
-            self.db.add(usage)
-            await self.db.commit()
-            await self.db.refresh(usage)
-        return usage
-
-    async def increment_daily_usage(self, user_id: int):
-        usage = await self.get_daily_usage(user_id)
-        usage.prompt_count += 1
-        await self.db.commit()
-        await self.db.refresh(usage)
\ No newline at end of file
+        return result.scalars().first()
@@ -0,0 +1,78 @@
+import time
+from typing import Dict, List, Optional
+
+import redis.asyncio as aioredis
+from kombu import Queue
+
+from app.core.config import settings
+from app.core.metrics import CELERY_QUEUE_WAIT
+from app.db.models import UserRole
+from app.utils.cache import get_redis_client
+
+DEFAULT_QUEUE = "celery"
+# Billing webhooks get their own queue so a rollover burst never sits in front of chat jobs.
+WEBHOOK_QUEUE = "webhooks"
+GEMINI_QUEUES = {
+    UserRole.PRO.value: "gemini.pro",
+    UserRole.BASIC.value: "gemini.basic",
+}
+TASK_QUEUES = [Queue(name) for name in GEMINI_QUEUES.values()] + [Queue(WEBHOOK_QUEUE), Queue(DEFAULT_QUEUE)]
+
+WAIT_SAMPLES = 1000
+
+_broker_client: Optional[aioredis.Redis] = None
+
+def queue_for_role(role: str) -> str:
+    return GEMINI_QUEUES.get(role, GEMINI_QUEUES[UserRole.BASIC.value])
+
+def _wait_key(queue: str) -> str:
+    return f"queue_wait:{queue}"
+
+async def _get_broker_client() -> aioredis.Redis:
+    global _broker_client
+    if _broker_client is None:
+        _broker_client = aioredis.from_url(settings.CELERY_BROKER_URL)
+    return _broker_client
+
+async def record_queue_wait(queue: str, enqueued_at: float):
+    wait = max(time.time() - enqueued_at, 0)
+    CELERY_QUEUE_WAIT.labels(queue).observe(wait)
+    redis_client = await get_redis_client()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.lpush(_wait_key(queue), wait)
+        pipe.ltrim(_wait_key(queue), 0, WAIT_SAMPLES - 1)
+        await pipe.execute()
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+async def get_queue_depths() -> Dict[str, int]:
+    # The Celery Redis transport keeps each queue as a plain list named after it.
+    broker = await _get_broker_client()
+    names = [queue.name for queue in TASK_QUEUES]
+    async with broker.pipeline(transaction=False) as pipe:
+        for name in names:
+            pipe.llen(name)
+        depths = await pipe.execute()
+    return dict(zip(names, depths))
+
+async def get_queue_stats() -> Dict[str, dict]:
+    depths = await get_queue_depths()
+    redis_client = await get_redis_client()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for name in depths:
+            pipe.lrange(_wait_key(name), 0, -1)
+        waits = await pipe.execute()
+
+    stats = {}
+    for (name, depth), samples in zip(depths.items(), waits):
+        samples = sorted(float(sample) for sample in samples)
+        stats[name] = {
+            "depth": depth,
+            "wait_p50_seconds": _percentile(samples, 0.5),
+            "wait_p95_seconds": _percentile(samples, 0.95),
+            "wait_max_seconds": samples[-1] if samples else 0.0,
+        }
+    return stats
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Coroutine, Deque, Dict, Optional
+
+from celery import current_task
+
+from app.core.config import settings
+from app.core.metrics import track_queries
+from app.db.session import engine
+
+# One event loop per worker process, running in a background thread. Celery
+# threads hand coroutines to it, so the SQLAlchemy engine, the Redis pool and
+# the Gemini client are created once and shared by every in-flight job.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+_scheduler: Optional["WeightedFairScheduler"] = None
+
+class WeightedFairScheduler:
+    # Grants up to ``capacity`` concurrent slots. When jobs are waiting, slots go
+    # to job classes in proportion to their weights (smooth weighted round robin),
+    # so a backlog of one class cannot starve another.
+    def __init__(self, capacity: int, weights: Dict[str, int]):
+        self.capacity = capacity
+        self.weights = weights
+        self.in_flight = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {}
+        self._current: Dict[str, int] = {}
+
+    def _weight(self, job_class: str) -> int:
+        return max(self.weights.get(job_class, 1), 1)
+
+    async def acquire(self, job_class: str):
+        if self.in_flight < self.capacity and not any(self._waiters.values()):
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_class, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.in_flight < self.capacity:
+            waiting = [job_class for job_class, queue in self._waiters.items() if queue]
+            if not waiting:
+                return
+            total = 0
+            for job_class in waiting:
+                self._current[job_class] = self._current.get(job_class, 0) + self._weight(job_class)
+                total += self._weight(job_class)
+            chosen = max(waiting, key=lambda job_class: self._current[job_class])
+            self._current[chosen] -= total
+            future = self._waiters[chosen].popleft()
+            if future.cancelled():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name="worker-event-loop", daemon=True)
+            _thread.start()
+    return _loop
+
+async def _run_limited(coro: Coroutine, job_class: str, label: str) -> Any:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = WeightedFairScheduler(settings.WORKER_MAX_IN_FLIGHT, settings.WORKER_QUEUE_WEIGHTS)
+    await _scheduler.acquire(job_class)
+    try:
+        with track_queries(label):
+            return await coro
+    finally:
+        _scheduler.release()
+
+def run_async(coro: Coroutine, job_class: str = "default") -> Any:
+    # SQL metrics are labelled with the calling task, like routes on the API side.
+    label = f"task:{current_task.name}" if current_task else "task:unknown"
+    future = asyncio.run_coroutine_threadsafe(_run_limited(coro, job_class, label), get_event_loop())
+    return future.result()
+
+def shutdown():
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(engine.dispose(), _loop).result(timeout=10)
+        _loop.call_soon_threadsafe(_loop.stop)
+        _thread.join(timeout=10)
+        _loop = None
+        _thread = None
@@ -1,23 +1,167 @@
 from celery import Celery
+from celery.signals import task_postrun, task_prerun, worker_init, worker_shutdown
+from prometheus_client import start_http_server
 from app.core.config import settings
-from app.services.gemini_service import GeminiService
-from app.db.session import async_session
+from app.core.metrics import CELERY_TASK_DURATION
+from app.db.partitions import ensure_message_partitions
+from app.db.session import async_session, engine
+from app.services.archive_service import ArchiveService
 from app.services.chatroom_service import ChatroomService
+from app.services.context_service import ContextService
+from app.services.gemini_service import get_gemini_service
+from app.services.payment_service import PaymentService
+from app.tasks.queues import DEFAULT_QUEUE, TASK_QUEUES, WEBHOOK_QUEUE, record_queue_wait
+from app.tasks.runtime import run_async, shutdown
+from app.utils.rate_limiter import flush_daily_usage
+from app.utils.admission import release_ai_job
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import time
 
 celery_app = Celery('tasks', broker=settings.CELERY_BROKER_URL, backend=settings.CELERY_RESULT_BACKEND)
+celery_app.conf.update(
+    # Tasks only wait on the shared event loop, so threads are cheap and let
+    # one process keep hundreds of Gemini calls in flight.
+    worker_pool="threads",
+    worker_concurrency=settings.WORKER_CONCURRENCY,
+    worker_prefetch_multiplier=1,
+    task_queues=TASK_QUEUES,
+    task_default_queue=DEFAULT_QUEUE,
+)
+celery_app.conf.beat_schedule = {
+    "flush-daily-usage": {
+        "task": "app.tasks.worker.flush_daily_usage_task",
+        "schedule": settings.RATE_LIMIT_FLUSH_INTERVAL_SECONDS,
+    },
+    "maintain-message-partitions": {
+        "task": "app.tasks.worker.maintain_message_partitions_task",
+        "schedule": settings.MESSAGE_PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+    },
+}
+
+_task_started_at: Dict[str, float] = {}
+
+@worker_init.connect
+def _start_metrics_server(**kwargs):
+    if settings.WORKER_METRICS_PORT:
+        try:
+            start_http_server(settings.WORKER_METRICS_PORT)
+        except OSError as e:
+            print(f"Worker metrics server not started on port {settings.WORKER_METRICS_PORT}: {e}")
+
+@task_prerun.connect
+def _task_started(task_id=None, **kwargs):
+    _task_started_at[task_id] = time.perf_counter()
+
+@task_postrun.connect
+def _task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started_at.pop(task_id, None)
+    if started is None or task is None:
+        return
+    queue = (task.request.delivery_info or {}).get("routing_key") or DEFAULT_QUEUE
+    CELERY_TASK_DURATION.labels(task.name, queue, state or "UNKNOWN").observe(time.perf_counter() - started)
+
+@worker_shutdown.connect
+def _shutdown_runtime(**kwargs):
+    shutdown()
+
+async def _process_gemini_message(chatroom_id: int, user_message_content: str, chat_history: list, queue: str, enqueued_at: Optional[float], admission_ticket: Optional[dict]):
+    try:
+        await _generate_reply(chatroom_id, user_message_content, chat_history, queue, enqueued_at)
+    finally:
+        try:
+            await release_ai_job(admission_ticket)
+        except Exception as e:
+            print(f"Failed to release admission ticket for chatroom {chatroom_id}: {e}")
+
+async def _generate_reply(chatroom_id: int, user_message_content: str, chat_history: list, queue: str, enqueued_at: Optional[float]):
+    if enqueued_at is not None:
+        try:
+            await record_queue_wait(queue, enqueued_at)
+        except Exception as e:
+            print(f"Failed to record queue wait for {queue}: {e}")
+
+    gemini_service = get_gemini_service()
+    try:
+        gemini_response = await gemini_service.get_gemini_response(user_message_content, chat_history)
+    except Exception as e:
+        print(f"Error processing Gemini message for chatroom {chatroom_id}: {e}")
+        gemini_response = "Sorry, I couldn't process your request right now. Please try again later."
 
-@celery_app.task
-async def process_gemini_message(chatroom_id: int, user_message_content: str, chat_history: list):
-    gemini_service = GeminiService()
     async with async_session() as db:
-        chatroom_service = ChatroomService(db)
+        await ChatroomService(db).add_message_to_chatroom(chatroom_id, "ai", gemini_response)
+
+        if settings.GEMINI_SUMMARY_ENABLED:
+            try:
+                await ContextService(db).refresh_summary(chatroom_id, gemini_service)
+            except Exception as e:
+                print(f"Error refreshing summary for chatroom {chatroom_id}: {e}")
+
+async def _refresh_chatroom_summary(chatroom_id: int):
+    async with async_session() as db:
         try:
-            gemini_response = await gemini_service.get_gemini_response(user_message_content, chat_history)
-            await chatroom_service.add_message_to_chatroom(chatroom_id, "ai", gemini_response)
+            await ContextService(db).refresh_summary(chatroom_id, get_gemini_service())
         except Exception as e:
-            print(f"Error processing Gemini message for chatroom {chatroom_id}: {e}")
-            await chatroom_service.add_message_to_chatroom(
-                chatroom_id,
-                "ai",
-                "Sorry, I couldn't process your request right now. Please try again later."
-            )
\ No newline at end of file
+            print(f"Error refreshing summary for chatroom {chatroom_id}: {e}")
+
+async def _process_stripe_event(event_id: str):
+    async with async_session() as db:
+        await PaymentService(db).process_webhook_event(event_id)
+
+async def _flush_daily_usage():
+    today = datetime.utcnow().date()
+    async with async_session() as db:
+        # Yesterday's set catches increments that landed after the last flush before midnight.
+        for day in (today - timedelta(days=1), today):
+            flushed = await flush_daily_usage(db, day.isoformat())
+            if flushed:
+                print(f"Persisted daily usage for {flushed} users on {day}")
+
+async def _maintain_message_partitions():
+    async with engine.begin() as conn:
+        created = await ensure_message_partitions(conn)
+    if created:
+        print(f"Created message partitions: {', '.join(created)}")
+
+    if settings.MESSAGE_ARCHIVE_ENABLED:
+        async with async_session() as db:
+            archived = await ArchiveService(db).archive_cold_partitions()
+        if archived:
+            print(f"Archived message partitions: {', '.join(archived)}")
+
+@celery_app.task(bind=True)
+def process_gemini_message(
+    self,
+    chatroom_id: int,
+    user_message_content: str,
+    chat_history: list,
+    enqueued_at: Optional[float] = None,
+    admission_ticket: Optional[dict] = None
+):
+    queue = (self.request.delivery_info or {}).get("routing_key") or DEFAULT_QUEUE
+    run_async(
+        _process_gemini_message(chatroom_id, user_message_content, chat_history, queue, enqueued_at, admission_ticket),
+        job_class=queue
+    )
+
+@celery_app.task
+def refresh_chatroom_summary(chatroom_id: int):
+    run_async(_refresh_chatroom_summary(chatroom_id))
+
+@celery_app.task
+def flush_daily_usage_task():
+    run_async(_flush_daily_usage())
+
+@celery_app.task
+def maintain_message_partitions_task():
+    run_async(_maintain_message_partitions())
+
+# acks_late so an event is redelivered if the worker dies mid-way; processing
+# is idempotent on the stripe_events row.
+@celery_app.task(bind=True, acks_late=True, max_retries=settings.STRIPE_WEBHOOK_MAX_RETRIES)
+def process_stripe_event(self, event_id: str):
+    try:
+        run_async(_process_stripe_event(event_id), job_class=WEBHOOK_QUEUE)
+    except Exception as e:
+        print(f"Error processing Stripe event {event_id}: {e}")
+        raise self.retry(exc=e, countdown=min(2 ** self.request.retries * 5, 300))
@@ -0,0 +1,86 @@
+import time
+import uuid
+from typing import Optional
+
+from app.core.config import settings
+from app.core.exceptions import ServiceOverloadedException, TooManyInFlightException
+from app.db.models import UserRole
+from app.utils.cache import get_redis_client
+
+GLOBAL_KEY = "admission:jobs"
+
+# Outstanding AI jobs (queued or running) are tracked as sorted sets of job ids
+# scored by a lease deadline, so jobs lost to a crashed worker age out on their own.
+# KEYS: global set, user set, chatroom set
+# ARGV: now, lease deadline, job id, global limit, user limit, chatroom limit
+# Returns 0 when admitted, otherwise which limit was hit (1 global, 2 user, 3 chatroom).
+ADMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+for i = 1, 3 do
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now)
+end
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[4]) then
+    return 1
+end
+if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[5]) then
+    return 2
+end
+if redis.call('ZCARD', KEYS[3]) >= tonumber(ARGV[6]) then
+    return 3
+end
+local lease_seconds = math.ceil(tonumber(ARGV[2]) - now)
+for i = 1, 3 do
+    redis.call('ZADD', KEYS[i], ARGV[2], ARGV[3])
+    redis.call('EXPIRE', KEYS[i], lease_seconds)
+end
+return 0
+"""
+
+def _user_key(user_id: int) -> str:
+    return f"admission:jobs:user:{user_id}"
+
+def _chatroom_key(chatroom_id: int) -> str:
+    return f"admission:jobs:chatroom:{chatroom_id}"
+
+def _global_limit(role: str) -> int:
+    # Basic traffic is shed first: it only gets a fraction of the global budget.
+    if role == UserRole.PRO.value:
+        return settings.ADMISSION_MAX_OUTSTANDING
+    return int(settings.ADMISSION_MAX_OUTSTANDING * settings.ADMISSION_BASIC_SHARE)
+
+async def admit_ai_job(user_id: int, role: str, chatroom_id: int) -> dict:
+    ticket = {"id": uuid.uuid4().hex, "user_id": user_id, "chatroom_id": chatroom_id}
+    now = time.time()
+    redis_client = await get_redis_client()
+    result = await redis_client.eval(
+        ADMIT_SCRIPT, 3, GLOBAL_KEY, _user_key(user_id), _chatroom_key(chatroom_id),
+        now,
+        now + settings.ADMISSION_JOB_LEASE_SECONDS,
+        ticket["id"],
+        _global_limit(role),
+        settings.ADMISSION_MAX_PER_USER,
+        settings.ADMISSION_MAX_PER_CHATROOM
+    )
+    if result == 1:
+        raise ServiceOverloadedException(retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS)
+    if result == 2:
+        raise TooManyInFlightException(
+            "Too many AI replies in progress for your account. Please wait for them to finish.",
+            retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS
+        )
+    if result == 3:
+        raise TooManyInFlightException(
+            "An AI reply is already in progress in this chatroom.",
+            retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS
+        )
+    return ticket
+
+async def release_ai_job(ticket: Optional[dict]):
+    if not ticket:
+        return
+    redis_client = await get_redis_client()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zrem(GLOBAL_KEY, ticket["id"])
+        pipe.zrem(_user_key(ticket["user_id"]), ticket["id"])
+        pipe.zrem(_chatroom_key(ticket["chatroom_id"]), ticket["id"])
+        await pipe.execute()
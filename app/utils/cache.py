@@ -1,35 +1,240 @@
+import asyncio
+import math
+import random
+import struct
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import orjson
 import redis.asyncio as aioredis
-import json
+
 from app.core.config import settings
-from typing import Any, Optional
+from app.core.metrics import record_cache
 
+redis_pool: Optional[aioredis.ConnectionPool] = None
 redis_client: Optional[aioredis.Redis] = None
 
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Values are stored as a fixed header followed by orjson bytes:
+# logical expiry (unix seconds) and how long the value took to compute.
+_HEADER = struct.Struct("!dd")
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class LocalTTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+local_cache = LocalTTLCache(maxsize=settings.CACHE_LOCAL_SIZE, ttl=settings.CACHE_LOCAL_TTL_SECONDS)
+
+_inflight: Dict[str, asyncio.Future] = {}
+_invalidation_task: Optional[asyncio.Task] = None
+
+# With raw=True the value is already-serialized bytes (e.g. a finished response
+# body) and is stored and returned as-is, skipping the orjson round trip.
+def pack_value(value: Any, ttl: int, compute_time: float = 0.0, raw: bool = False) -> bytes:
+    return _HEADER.pack(time.time() + ttl, compute_time) + (value if raw else orjson.dumps(value))
+
+def unpack_value(data: bytes, raw: bool = False):
+    expires_at, compute_time = _HEADER.unpack_from(data)
+    body = data[_HEADER.size:]
+    return expires_at, compute_time, body if raw else orjson.loads(body)
+
+def _should_refresh_early(expires_at: float, compute_time: float) -> bool:
+    # Probabilistic early expiration (XFetch): the closer to expiry and the more
+    # expensive the value, the likelier a single reader recomputes it ahead of time.
+    if compute_time <= 0:
+        return False
+    return time.time() - compute_time * settings.CACHE_EARLY_REFRESH_BETA * math.log(random.random()) >= expires_at
+
 async def init_redis_cache():
-    global redis_client
-    redis_client = aioredis.Redis(
+    global redis_pool, redis_client
+    redis_pool = aioredis.ConnectionPool(
         host=settings.REDIS_HOST,
         port=settings.REDIS_PORT,
         db=settings.REDIS_DB,
-        password=settings.REDIS_PASSWORD,
-        decode_responses=True
+        password=settings.REDIS_PASSWORD or None,
+        max_connections=settings.REDIS_MAX_CONNECTIONS
     )
+    redis_client = aioredis.Redis(connection_pool=redis_pool)
     print("Redis cache initialized.")
 
-async def get_cached_data(key: str) -> Any  :
-    if not redis_client:
-        await init_redis_cache()
-    data = await redis_client.get(key)
-    if data:
-        return json.loads(data)
-    return None
+async def close_redis_cache():
+    global redis_pool, redis_client, _invalidation_task
+    if _invalidation_task:
+        _invalidation_task.cancel()
+        _invalidation_task = None
+    if redis_client:
+        await redis_client.aclose()
+    if redis_pool:
+        await redis_pool.disconnect()
+    redis_client = None
+    redis_pool = None
+    local_cache.clear()
 
-async def set_cached_data(key: str, data: Any, ttl: int = 300):
+async def get_redis_client() -> aioredis.Redis:
     if not redis_client:
         await init_redis_cache()
-    await redis_client.setex(key, ttl, json.dumps(data))
+    return redis_client
+
+async def _listen_for_invalidations():
+    client = await get_redis_client()
+    while True:
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        local_cache.delete(message["data"].decode())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}")
+            await asyncio.sleep(1)
+
+def start_invalidation_listener():
+    global _invalidation_task
+    if _invalidation_task is None:
+        _invalidation_task = asyncio.create_task(_listen_for_invalidations())
+
+async def get_cached_data(key: str, local_ttl: Optional[float] = None) -> Any  :
+    value = local_cache.get(key)
+    if value is not None:
+        record_cache(key, "local_hit")
+        return value
+    client = await get_redis_client()
+    data = await client.get(key)
+    if data is None:
+        record_cache(key, "miss")
+        return None
+    record_cache(key, "hit")
+    _, _, value = unpack_value(data)
+    local_cache.set(key, value, local_ttl)
+    return value
+
+async def set_cached_data(key: str, data: Any, ttl: int = 300, local_ttl: Optional[float] = None, compute_time: float = 0.0, raw: bool = False):
+    client = await get_redis_client()
+    await client.set(key, pack_value(data, ttl, compute_time, raw), ex=ttl)
+    local_cache.set(key, data, local_ttl)
 
 async def invalidate_cache(key: str):
-    if not redis_client:
-        await init_redis_cache()
-    await redis_client.delete(key)
\ No newline at end of file
+    local_cache.delete(key)
+    client = await get_redis_client()
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.delete(key)
+        pipe.publish(INVALIDATION_CHANNEL, key)
+        await pipe.execute()
+
+async def replace_cached_data(key: str, data: Any, ttl: int = 300, local_ttl: Optional[float] = None):
+    # Write-through for values other processes may hold locally: store the new
+    # value and tell them to drop their copies.
+    client = await get_redis_client()
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.set(key, pack_value(data, ttl), ex=ttl)
+        pipe.publish(INVALIDATION_CHANNEL, key)
+        await pipe.execute()
+    local_cache.set(key, data, local_ttl)
+
+async def _load_and_store(key: str, loader: Callable[[], Awaitable[Any]], ttl: int, local_ttl: Optional[float], raw: bool) -> Any:
+    started = time.perf_counter()
+    value = await loader()
+    await set_cached_data(key, value, ttl, local_ttl, compute_time=time.perf_counter() - started, raw=raw)
+    return value
+
+async def _recompute(key: str, loader: Callable[[], Awaitable[Any]], ttl: int, local_ttl: Optional[float], stale: Any, raw: bool) -> Any:
+    client = await get_redis_client()
+    lock_key = f"lock:{key}"
+    token = uuid.uuid4().hex
+    if await client.set(lock_key, token, nx=True, px=settings.CACHE_LOCK_TIMEOUT_MS):
+        try:
+            return await _load_and_store(key, loader, ttl, local_ttl, raw)
+        finally:
+            await client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+    # Another process is rebuilding the value: serve the stale copy if there is
+    # one, otherwise wait briefly for it to land before loading it ourselves.
+    if stale is not None:
+        return stale
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT_MS / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        data = await client.get(key)
+        if data is not None:
+            _, _, value = unpack_value(data, raw)
+            local_cache.set(key, value, local_ttl)
+            return value
+    return await loader()
+
+async def get_or_set(key: str, loader: Callable[[], Awaitable[Any]], ttl: int = 300, local_ttl: Optional[float] = None, raw: bool = False) -> Any:
+    value = local_cache.get(key)
+    if value is not None:
+        record_cache(key, "local_hit")
+        return value
+
+    client = await get_redis_client()
+    data = await client.get(key)
+    stale = None
+    if data is not None:
+        expires_at, compute_time, value = unpack_value(data, raw)
+        if not _should_refresh_early(expires_at, compute_time):
+            record_cache(key, "hit")
+            local_cache.set(key, value, local_ttl)
+            return value
+        record_cache(key, "early_refresh")
+        stale = value
+    else:
+        record_cache(key, "miss")
+
+    # Collapse concurrent misses in this process onto one load.
+    future = _inflight.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        value = await _recompute(key, loader, ttl, local_ttl, stale, raw)
+        future.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark the exception as retrieved when nobody else was waiting on it.
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
@@ -0,0 +1,78 @@
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.db.models import Message
+from app.schemas.chatroom import MessageResponse
+from app.utils.cache import get_redis_client
+
+# Each chatroom has a capped Redis stream of committed messages. Any API replica
+# can tail it, and a reconnecting client resumes from the last id it saw.
+
+_stream_pool: Optional[aioredis.ConnectionPool] = None
+_stream_client: Optional[aioredis.Redis] = None
+
+def _stream_key(chatroom_id: int) -> str:
+    return f"chatroom_events:{chatroom_id}"
+
+async def publish_message(message: Message):
+    client = await get_redis_client()
+    key = _stream_key(message.chatroom_id)
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.xadd(
+            key,
+            {"message": MessageResponse.model_validate(message).model_dump_json()},
+            maxlen=settings.CHATROOM_EVENTS_MAXLEN,
+            approximate=True,
+        )
+        pipe.expire(key, settings.CHATROOM_EVENTS_TTL_SECONDS)
+        await pipe.execute()
+
+def _get_stream_client() -> aioredis.Redis:
+    # Blocking XREADs hold a connection each, so they get their own pool and
+    # cannot starve cache and rate-limit traffic.
+    global _stream_pool, _stream_client
+    if _stream_client is None:
+        _stream_pool = aioredis.ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD or None,
+            max_connections=settings.CHATROOM_EVENTS_MAX_CONNECTIONS
+        )
+        _stream_client = aioredis.Redis(connection_pool=_stream_pool)
+    return _stream_client
+
+async def close_event_streams():
+    global _stream_pool, _stream_client
+    if _stream_client:
+        await _stream_client.aclose()
+    if _stream_pool:
+        await _stream_pool.disconnect()
+    _stream_client = None
+    _stream_pool = None
+
+async def _latest_id(client: aioredis.Redis, key: str) -> str:
+    entries = await client.xrevrange(key, count=1)
+    return entries[0][0].decode() if entries else "0-0"
+
+async def tail_chatroom(chatroom_id: int, last_id: Optional[str] = None) -> AsyncIterator[List[Tuple[str, dict]]]:
+    # Yields batches of (event id, message) after last_id, replaying whatever
+    # is still in the stream first. An empty batch means the block timed out.
+    client = _get_stream_client()
+    key = _stream_key(chatroom_id)
+    position = last_id or await _latest_id(client, key)
+    while True:
+        response = await client.xread(
+            {key: position},
+            count=settings.CHATROOM_EVENTS_BATCH_SIZE,
+            block=settings.CHATROOM_EVENTS_BLOCK_MS,
+        )
+        batch = []
+        for _, entries in response or []:
+            for event_id, fields in entries:
+                position = event_id.decode()
+                batch.append((position, json.loads(fields[b"message"])))
+        yield batch
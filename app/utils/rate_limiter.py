@@ -1,22 +1,146 @@
-from fastapi import HTTPException, status
-from app.db.models import UserRole
-from app.services.user_service import UserService
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime, date
-
-BASIC_TIER_PROMPT_LIMIT = 5
-
-async def check_rate_limit(user_id: int, db: AsyncSession):
-    user_service = UserService(db)
-    user_data = await user_service.db.get(type=type('User', (object,), {}),ident=user_id) 
-    if not user_data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-
-    if user_data.role == UserRole.BASIC.value:
-        daily_usage = await user_service.get_daily_usage(user_id)
-        if daily_usage.prompt_count >= BASIC_TIER_PROMPT_LIMIT:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Daily message limit exceeded for your Basic tier. Upgrade to Pro for more."
-            )
-        await user_service.increment_daily_usage(user_id)
\ No newline at end of file
+
+from app.core.config import settings
+from app.core.exceptions import DailyUsageLimitExceededException, RateLimitExceededException
+from app.core.metrics import RATE_LIMIT_DECISIONS
+from app.db.dialects import greatest, insert
+from app.db.models import DailyUsage, User, UserRole
+from app.utils.cache import get_redis_client
+from app.utils.subscription_cache import get_subscription_tier
+
+DAILY_LIMITS = {
+    UserRole.BASIC.value: settings.RATE_LIMIT_BASIC_DAILY_PROMPTS,
+    UserRole.PRO.value: settings.RATE_LIMIT_PRO_DAILY_PROMPTS,
+}
+
+# KEYS: daily counter, token bucket, dirty-user set
+# ARGV: daily limit (-1 = unlimited), counter ttl, bucket capacity, refill/s, now (ms), user id
+# Returns {1, count} when allowed, {0, 0} when the daily quota is spent and
+# {-1, retry_ms} when the short-window bucket is empty.
+RATE_LIMIT_SCRIPT = """
+local daily_limit = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+local capacity = tonumber(ARGV[3])
+local rate = tonumber(ARGV[4])
+local now = tonumber(ARGV[5])
+
+local tokens = capacity
+if capacity > 0 then
+    local bucket = redis.call('HMGET', KEYS[2], 'tokens', 'ts')
+    local last_tokens = tonumber(bucket[1])
+    local last_ts = tonumber(bucket[2])
+    if last_tokens and last_ts then
+        tokens = math.min(capacity, last_tokens + math.max(0, now - last_ts) * rate / 1000)
+    end
+    if tokens < 1 then
+        return {-1, math.ceil((1 - tokens) * 1000 / rate)}
+    end
+end
+
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+if daily_limit >= 0 and used >= daily_limit then
+    return {0, 0}
+end
+
+if capacity > 0 then
+    redis.call('HSET', KEYS[2], 'tokens', tokens - 1, 'ts', now)
+    redis.call('PEXPIRE', KEYS[2], math.ceil(capacity * 1000 / rate) + 1000)
+end
+used = redis.call('INCR', KEYS[1])
+if used == 1 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+redis.call('SADD', KEYS[3], ARGV[6])
+redis.call('EXPIRE', KEYS[3], ttl)
+return {1, used}
+"""
+
+_rate_limit_script = None
+
+def _daily_key(day: str, user_id: int) -> str:
+    return f"rate_limit:daily:{day}:{user_id}"
+
+def _dirty_key(day: str) -> str:
+    return f"rate_limit:dirty:{day}"
+
+def _seconds_until_midnight(now: datetime) -> int:
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(int((tomorrow - now).total_seconds()), 1)
+
+async def _get_script():
+    # Re-register when the shared client was replaced (e.g. after a reconnect).
+    global _rate_limit_script
+    redis_client = await get_redis_client()
+    if _rate_limit_script is None or _rate_limit_script.registered_client is not redis_client:
+        _rate_limit_script = redis_client.register_script(RATE_LIMIT_SCRIPT)
+    return _rate_limit_script
+
+def _usage_upsert(rows: list):
+    # Keeps the larger count, so a replayed flush never lowers a stored total.
+    stmt = insert(DailyUsage).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[DailyUsage.user_id, DailyUsage.date],
+        set_={"prompt_count": greatest(DailyUsage.prompt_count, stmt.excluded.prompt_count)},
+    )
+
+async def check_rate_limit(user: User, tier: Optional[str] = None):
+    now = datetime.utcnow()
+    day = now.date().isoformat()
+    until_midnight = _seconds_until_midnight(now)
+    if tier is None:
+        tier = await get_subscription_tier(user.id, fallback=user.role)
+    daily_limit = DAILY_LIMITS.get(tier, settings.RATE_LIMIT_BASIC_DAILY_PROMPTS)
+
+    script = await _get_script()
+    status_code, value = await script(
+        keys=[_daily_key(day, user.id), f"rate_limit:bucket:{user.id}", _dirty_key(day)],
+        args=[
+            daily_limit,
+            # Keep counters a day past midnight so the flush can still read them.
+            until_midnight + 86400,
+            settings.RATE_LIMIT_BURST,
+            settings.RATE_LIMIT_REFILL_PER_SECOND,
+            int(time.time() * 1000),
+            user.id,
+        ],
+    )
+    if status_code == 0:
+        RATE_LIMIT_DECISIONS.labels(tier, "daily_limit").inc()
+        raise DailyUsageLimitExceededException(retry_after=until_midnight)
+    if status_code == -1:
+        RATE_LIMIT_DECISIONS.labels(tier, "burst_limit").inc()
+        raise RateLimitExceededException(retry_after=max(int(value) // 1000, 1))
+    RATE_LIMIT_DECISIONS.labels(tier, "allowed").inc()
+
+async def flush_daily_usage(db: AsyncSession, day: Optional[str] = None) -> int:
+    redis_client = await get_redis_client()
+    day = day or datetime.utcnow().date().isoformat()
+    day_start = datetime.fromisoformat(day)
+    flushed = 0
+
+    while True:
+        user_ids = await redis_client.spop(_dirty_key(day), settings.RATE_LIMIT_FLUSH_BATCH_SIZE)
+        if not user_ids:
+            break
+        user_ids = [int(user_id) for user_id in user_ids]
+        counts = await redis_client.mget([_daily_key(day, user_id) for user_id in user_ids])
+        rows = [
+            {"user_id": user_id, "date": day_start, "prompt_count": int(count)}
+            for user_id, count in zip(user_ids, counts)
+            if count is not None
+        ]
+        if not rows:
+            continue
+        try:
+            await db.execute(_usage_upsert(rows))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            await redis_client.sadd(_dirty_key(day), *user_ids)
+            raise
+        flushed += len(rows)
+    return flushed
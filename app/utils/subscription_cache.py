@@ -0,0 +1,53 @@
+from typing import Optional
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.db.models import Subscription, User, UserRole
+from app.db.session import async_session
+from app.utils.cache import get_or_set, replace_cached_data
+
+def _subscription_key(user_id: int) -> str:
+    return f"subscription_{user_id}"
+
+def subscription_state(role: Optional[str], subscription: Optional[Subscription]) -> dict:
+    if subscription is None:
+        return {"tier": role or UserRole.BASIC.value, "status": "no_subscription", "current_period_end": None}
+    return {
+        "tier": subscription.tier,
+        "status": subscription.status,
+        "current_period_end": subscription.current_period_end,
+    }
+
+async def _load_subscription_state(user_id: int) -> dict:
+    async with async_session() as db:
+        stmt = (
+            select(User.role, Subscription)
+            .outerjoin(Subscription, Subscription.user_id == User.id)
+            .where(User.id == user_id)
+        )
+        row = (await db.execute(stmt)).first()
+    if row is None:
+        return subscription_state(None, None)
+    return subscription_state(row[0], row[1])
+
+async def get_subscription_state(user_id: int) -> dict:
+    return await get_or_set(
+        _subscription_key(user_id),
+        lambda: _load_subscription_state(user_id),
+        ttl=settings.SUBSCRIPTION_CACHE_TTL_SECONDS,
+        local_ttl=settings.SUBSCRIPTION_CACHE_LOCAL_TTL_SECONDS
+    )
+
+async def get_subscription_tier(user_id: int, fallback: Optional[str] = None) -> str:
+    try:
+        return (await get_subscription_state(user_id))["tier"]
+    except Exception as e:
+        print(f"Subscription cache read failed for user {user_id}: {e}")
+        return fallback or UserRole.BASIC.value
+
+async def store_subscription_state(user_id: int, state: dict):
+    await replace_cached_data(
+        _subscription_key(user_id),
+        state,
+        ttl=settings.SUBSCRIPTION_CACHE_TTL_SECONDS,
+        local_ttl=settings.SUBSCRIPTION_CACHE_LOCAL_TTL_SECONDS
+    )
\ No newline at end of file
@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import math
+import time
+from typing import Dict, Optional
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.exceptions import AuthUnavailableException
+from app.utils.cache import get_redis_client
+
+REVOKED_TOKENS_KEY = "jwt:revoked"
+USER_EPOCHS_KEY = "jwt:user_epochs"
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.sha256(item.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(item))
+
+# Local view of the Redis revocation state, refreshed every
+# JWT_REVOCATION_REFRESH_SECONDS. A bloom filter miss proves a token id was
+# not revoked, so the common case costs no Redis round trip; a hit is
+# confirmed against Redis to rule out false positives.
+#
+# If Redis is unreachable the last snapshot stays in use and the refresh is
+# retried after JWT_REVOCATION_RETRY_SECONDS. A filter hit that cannot be
+# confirmed fails closed with a 503 rather than letting the token through.
+_revoked_filter = BloomFilter(settings.JWT_REVOCATION_BLOOM_CAPACITY)
+_user_epochs: Dict[str, float] = {}
+_next_refresh_at = 0.0
+_refresh_lock: Optional[asyncio.Lock] = None
+
+async def _refresh_local_state():
+    global _revoked_filter, _user_epochs, _next_refresh_at, _refresh_lock
+    if time.monotonic() < _next_refresh_at:
+        return
+    if _refresh_lock is None:
+        _refresh_lock = asyncio.Lock()
+    async with _refresh_lock:
+        if time.monotonic() < _next_refresh_at:
+            return
+        now = time.time()
+        try:
+            redis_client = await get_redis_client()
+            async with redis_client.pipeline(transaction=False) as pipe:
+                # Entries older than the token lifetime can no longer match a live token.
+                pipe.zremrangebyscore(REVOKED_TOKENS_KEY, "-inf", now)
+                pipe.zremrangebyscore(USER_EPOCHS_KEY, "-inf", now - settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+                pipe.zrange(REVOKED_TOKENS_KEY, 0, -1)
+                pipe.zrange(USER_EPOCHS_KEY, 0, -1, withscores=True)
+                _, _, revoked, epochs = await pipe.execute()
+        except RedisError as e:
+            print(f"Token revocation refresh failed, keeping the last snapshot: {e}")
+            _next_refresh_at = time.monotonic() + settings.JWT_REVOCATION_RETRY_SECONDS
+            return
+
+        revoked_filter = BloomFilter(max(settings.JWT_REVOCATION_BLOOM_CAPACITY, len(revoked) * 2))
+        for jti in revoked:
+            revoked_filter.add(jti.decode())
+        _revoked_filter = revoked_filter
+        _user_epochs = {user_id.decode(): epoch for user_id, epoch in epochs}
+        _next_refresh_at = time.monotonic() + settings.JWT_REVOCATION_REFRESH_SECONDS
+
+async def is_token_revoked(payload: dict) -> bool:
+    await _refresh_local_state()
+
+    epoch = _user_epochs.get(str(payload.get("sub")))
+    if epoch is not None and payload.get("iat", 0) < epoch:
+        return True
+
+    jti = payload.get("jti")
+    if jti and jti in _revoked_filter:
+        try:
+            redis_client = await get_redis_client()
+            return await redis_client.zscore(REVOKED_TOKENS_KEY, jti) is not None
+        except RedisError as e:
+            print(f"Token revocation check failed for {jti}: {e}")
+            raise AuthUnavailableException(retry_after=max(int(settings.JWT_REVOCATION_RETRY_SECONDS), 1))
+    return False
+
+async def revoke_token(payload: dict):
+    jti = payload.get("jti")
+    if not jti:
+        return
+    redis_client = await get_redis_client()
+    await redis_client.zadd(REVOKED_TOKENS_KEY, {jti: payload.get("exp", time.time())})
+    _revoked_filter.add(jti)
+
+async def revoke_user_tokens(user_id: int):
+    # Every token for this user issued before now (by ``iat``) is rejected.
+    epoch = int(time.time())
+    redis_client = await get_redis_client()
+    await redis_client.zadd(USER_EPOCHS_KEY, {str(user_id): epoch})
+    _user_epochs[str(user_id)] = epoch
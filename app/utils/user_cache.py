@@ -0,0 +1,56 @@
+from datetime import datetime
+from typing import Optional
+from app.core.config import settings
+from app.db.models import User
+from app.utils.cache import get_cached_data, set_cached_data, invalidate_cache
+
+def _user_key(user_id: int) -> str:
+    return f"user_{user_id}"
+
+def _serialize_user(user: User) -> dict:
+    return {
+        "id": user.id,
+        "mobile_number": user.mobile_number,
+        "role": user.role,
+        "created_at": user.created_at,
+        "updated_at": user.updated_at,
+    }
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def _deserialize_user(data: dict) -> User:
+    # Detached copy without hashed_password; callers that need the hash re-read it from the DB.
+    return User(
+        id=data["id"],
+        mobile_number=data["mobile_number"],
+        role=data["role"],
+        created_at=_parse_datetime(data["created_at"]),
+        updated_at=_parse_datetime(data["updated_at"]),
+    )
+
+async def get_cached_user(user_id: int) -> Optional[User]:
+    try:
+        data = await get_cached_data(_user_key(user_id), local_ttl=settings.USER_CACHE_LOCAL_TTL_SECONDS)
+    except Exception as e:
+        print(f"User cache read failed for user {user_id}: {e}")
+        return None
+    if data is None:
+        return None
+    return _deserialize_user(data)
+
+async def cache_user(user: User):
+    try:
+        await set_cached_data(
+            _user_key(user.id),
+            _serialize_user(user),
+            ttl=settings.USER_CACHE_TTL_SECONDS,
+            local_ttl=settings.USER_CACHE_LOCAL_TTL_SECONDS
+        )
+    except Exception as e:
+        print(f"User cache write failed for user {user.id}: {e}")
+
+async def invalidate_user(user_id: int):
+    await invalidate_cache(_user_key(user_id))
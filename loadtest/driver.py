@@ -0,0 +1,343 @@
+"""Drives user journeys against a running API and reports latency per route.
+
+Each virtual user signs up, logs in through OTP, creates a chatroom, sends a
+few messages (polling or streaming for the AI reply) and reads its data back.
+A share of users upgrades through a signed Stripe webhook, and an optional
+webhook storm replays billing-rollover traffic with duplicate deliveries.
+
+    python -m loadtest.driver --base-url http://127.0.0.1:8000 --users 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from loadtest.fake_stripe import checkout_completed, invoice_payment_succeeded, send_webhook
+
+API = "/api"
+SHED_STATUSES = {429, 503}
+REPLY_ROUTE = "AI reply (end-to-end)"
+FIRST_DELTA_ROUTE = "SSE first delta"
+# Errors here mean the journey itself is broken, not that the stack is slow.
+CORE_ROUTES = (
+    "POST /auth/signup",
+    "POST /auth/send-otp",
+    "POST /auth/verify-otp",
+    "POST /chatroom",
+    "POST /chatroom/{id}/message",
+    REPLY_ROUTE,
+)
+
+PROMPTS = [
+    "Summarise the trade-offs between caching at the edge and in the application.",
+    "What is a good way to size a worker pool for IO-bound jobs?",
+    "Explain keyset pagination in two sentences.",
+    "Give me three ideas for naming a chatroom about databases.",
+    "How do token buckets differ from fixed windows for rate limiting?",
+]
+
+class JourneyAborted(Exception):
+    pass
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(max(math.ceil(len(samples) * fraction) - 1, 0), len(samples) - 1)]
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.shed: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.journeys = 0
+        self.aborted = 0
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+
+    def record(self, route: str, seconds: float, status=None, ok: bool = True):
+        self.latencies[route].append(seconds)
+        if status is not None:
+            self.statuses[route][str(status)] += 1
+        if status in SHED_STATUSES:
+            self.shed[route] += 1
+        elif not ok:
+            self.errors[route] += 1
+
+    def summary(self) -> dict:
+        duration = (self.finished_at or time.perf_counter()) - self.started_at
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            routes[route] = {
+                "count": len(samples),
+                "errors": self.errors[route],
+                "shed": self.shed[route],
+                "rps": len(samples) / duration if duration else 0.0,
+                "p50_ms": percentile(samples, 0.50) * 1000,
+                "p95_ms": percentile(samples, 0.95) * 1000,
+                "p99_ms": percentile(samples, 0.99) * 1000,
+                "max_ms": samples[-1] * 1000,
+                "statuses": dict(self.statuses[route]),
+            }
+        return {
+            "duration_seconds": duration,
+            "journeys": self.journeys,
+            "aborted_journeys": self.aborted,
+            "routes": routes,
+        }
+
+async def call(client: httpx.AsyncClient, stats: Stats, method: str, path: str, route: str, expected: Iterable[int] = (200,), **kwargs) -> httpx.Response:
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+    except httpx.HTTPError as e:
+        stats.record(route, time.perf_counter() - started, type(e).__name__, ok=False)
+        raise JourneyAborted(f"{route}: {e}") from e
+    stats.record(route, time.perf_counter() - started, response.status_code, ok=response.status_code in expected)
+    return response
+
+def _retry_after(response: httpx.Response) -> float:
+    try:
+        return float(response.headers.get("Retry-After", 1))
+    except ValueError:
+        return 1.0
+
+def _require(response: httpx.Response, *expected: int) -> httpx.Response:
+    if response.status_code not in expected:
+        raise JourneyAborted(f"{response.request.method} {response.request.url.path} -> {response.status_code}")
+    return response
+
+class Journey:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, args: argparse.Namespace, index: int):
+        self.client = client
+        self.stats = stats
+        self.args = args
+        self.mobile = f"+9{args.run_id:05d}{index:06d}"
+        self.headers: Dict[str, str] = {}
+
+    async def _call(self, method: str, path: str, route: str, expected: Iterable[int] = (200,), **kwargs) -> httpx.Response:
+        return await call(self.client, self.stats, method, API + path, route, expected, headers=self.headers, **kwargs)
+
+    async def login(self) -> int:
+        password = "loadtest-password"
+        user = _require(await self._call("POST", "/auth/signup", "POST /auth/signup", (201,), json={"mobile_number": self.mobile, "password": password}), 201).json()
+        otp = _require(await self._call("POST", "/auth/send-otp", "POST /auth/send-otp", json={"mobile_number": self.mobile}), 200).json()["otp_code"]
+        token = _require(await self._call("POST", "/auth/verify-otp", "POST /auth/verify-otp", json={"mobile_number": self.mobile, "otp_code": otp}), 200).json()["access_token"]
+        self.headers = {"Authorization": f"Bearer {token}"}
+        return user["id"]
+
+    async def upgrade(self, user_id: int):
+        started = time.perf_counter()
+        response = await send_webhook(self.client, API + "/webhook/stripe", checkout_completed(user_id), self.args.webhook_secret)
+        self.stats.record("POST /webhook/stripe", time.perf_counter() - started, response.status_code, ok=response.status_code == 200)
+
+    async def send(self, chatroom_id: int, content: str) -> Optional[dict]:
+        # Shed and rate-limited sends are retried after Retry-After, as a client would.
+        for _ in range(self.args.send_attempts):
+            response = await self._call("POST", f"/chatroom/{chatroom_id}/message", "POST /chatroom/{id}/message", (201,), json={"content": content})
+            if response.status_code == 201:
+                return response.json()
+            if response.status_code not in SHED_STATUSES:
+                return None
+            await asyncio.sleep(min(_retry_after(response), self.args.reply_timeout))
+        return None
+
+    async def wait_for_reply(self, chatroom_id: int, after_id: int, sent_at: float):
+        deadline = sent_at + self.args.reply_timeout
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.args.poll_interval)
+            response = await self._call("GET", f"/chatroom/{chatroom_id}/messages", "GET /chatroom/{id}/messages", params={"after": after_id})
+            if response.status_code == 200 and any(m["sender"] == "ai" for m in response.json()["messages"]):
+                self.stats.record(REPLY_ROUTE, time.perf_counter() - sent_at)
+                return
+        self.stats.record(REPLY_ROUTE, time.perf_counter() - sent_at, "timeout", ok=False)
+
+    async def stream(self, chatroom_id: int, content: str):
+        route = "POST /chatroom/{id}/message/stream"
+        started = time.perf_counter()
+        status = None
+        try:
+            async with self.client.stream("POST", f"{API}/chatroom/{chatroom_id}/message/stream", json={"content": content}, headers=self.headers) as response:
+                status = response.status_code
+                if status == 200:
+                    first_delta = False
+                    async for line in response.aiter_lines():
+                        if line == "event: delta" and not first_delta:
+                            first_delta = True
+                            self.stats.record(FIRST_DELTA_ROUTE, time.perf_counter() - started)
+                        elif line == "event: error":
+                            status = "stream_error"
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.stats.record(route, time.perf_counter() - started, status, ok=status == 200)
+
+    async def run(self):
+        user_id = await self.login()
+        if random.random() < self.args.upgrade_ratio:
+            await self.upgrade(user_id)
+
+        chatroom = _require(await self._call("POST", "/chatroom", "POST /chatroom", (201,), json={"name": f"load test {self.mobile}"}), 201).json()
+        chatroom_id = chatroom["id"]
+        for _ in range(self.args.messages):
+            content = random.choice(PROMPTS)
+            if random.random() < self.args.stream_ratio:
+                await self.stream(chatroom_id, content)
+            else:
+                sent_at = time.perf_counter()
+                message = await self.send(chatroom_id, content)
+                if message:
+                    await self.wait_for_reply(chatroom_id, message["id"], sent_at)
+            if self.args.think_time:
+                await asyncio.sleep(random.uniform(0, 2 * self.args.think_time))
+
+        await self._call("GET", "/chatroom", "GET /chatroom")
+        await self._call("GET", f"/chatroom/{chatroom_id}", "GET /chatroom/{id}")
+        await self._call("GET", "/subscription/status", "GET /subscription/status")
+        await self._call("GET", "/user/me", "GET /user/me")
+
+async def webhook_storm(client: httpx.AsyncClient, stats: Stats, args: argparse.Namespace):
+    # Billing rollover: a burst of renewals, some delivered more than once.
+    events = [invoice_payment_succeeded(f"sub_{uuid.uuid4().hex[:24]}") for _ in range(args.webhook_storm)]
+    deliveries = events + random.sample(events, int(len(events) * args.webhook_duplicate_ratio))
+    random.shuffle(deliveries)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def deliver(event: dict):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await send_webhook(client, API + "/webhook/stripe", event, args.webhook_secret)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            stats.record("POST /webhook/stripe (storm)", time.perf_counter() - started, status, ok=status == 200)
+
+    await asyncio.gather(*(deliver(event) for event in deliveries))
+
+async def run(args: argparse.Namespace) -> dict:
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.request_timeout, limits=limits) as client:
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def virtual_user(index: int):
+            if args.ramp_up:
+                await asyncio.sleep(args.ramp_up * index / max(args.users, 1))
+            async with semaphore:
+                try:
+                    await Journey(client, stats, args, index).run()
+                    stats.journeys += 1
+                except JourneyAborted as e:
+                    stats.aborted += 1
+                    if args.verbose:
+                        print(f"journey {index} aborted: {e}", file=sys.stderr)
+
+        jobs = [virtual_user(index) for index in range(args.users)]
+        if args.webhook_storm:
+            jobs.append(webhook_storm(client, stats, args))
+        await asyncio.gather(*jobs)
+    stats.finished_at = time.perf_counter()
+    return stats.summary()
+
+def print_report(summary: dict):
+    print(f"\n{summary['journeys']} journeys completed, {summary['aborted_journeys']} aborted in {summary['duration_seconds']:.1f}s\n")
+    header = f"{'route':<40} {'count':>7} {'err':>5} {'shed':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for route, row in summary["routes"].items():
+        print(
+            f"{route:<40} {row['count']:>7} {row['errors']:>5} {row['shed']:>5} {row['rps']:>8.1f} "
+            f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}"
+        )
+
+def check_core_routes(summary: dict, max_error_rate: float) -> List[str]:
+    failures = []
+    for route in CORE_ROUTES:
+        row = summary["routes"].get(route)
+        if not row:
+            failures.append(f"{route}: no requests")
+            continue
+        error_rate = row["errors"] / row["count"]
+        if error_rate > max_error_rate:
+            failures.append(f"{route}: {row['errors']}/{row['count']} errors ({error_rate:.1%})")
+    return failures
+
+def compare_to_baseline(summary: dict, baseline: dict, max_regression: float, min_count: int = 20) -> List[str]:
+    regressions = []
+    for route, row in summary["routes"].items():
+        previous = baseline.get("routes", {}).get(route)
+        if not previous or row["count"] < min_count or previous["count"] < min_count:
+            continue
+        if row["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{route}: p95 {previous['p95_ms']:.1f}ms -> {row['p95_ms']:.1f}ms")
+        error_rate = row["errors"] / row["count"]
+        previous_error_rate = previous["errors"] / previous["count"]
+        if error_rate > previous_error_rate + 0.01:
+            regressions.append(f"{route}: error rate {previous_error_rate:.1%} -> {error_rate:.1%}")
+    return regressions
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=50, help="virtual users, one journey each")
+    parser.add_argument("--concurrency", type=int, default=20, help="journeys running at once")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="seconds over which journeys start")
+    parser.add_argument("--messages", type=int, default=5, help="messages sent per journey")
+    parser.add_argument("--stream-ratio", type=float, default=0.0, help="share of messages sent via the SSE endpoint")
+    parser.add_argument("--upgrade-ratio", type=float, default=0.1, help="share of users upgraded via a checkout webhook")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between messages, seconds")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--reply-timeout", type=float, default=60.0)
+    parser.add_argument("--send-attempts", type=int, default=5)
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--webhook-storm", type=int, default=0, help="renewal webhooks fired alongside the journeys")
+    parser.add_argument("--webhook-duplicate-ratio", type=float, default=0.2)
+    parser.add_argument("--webhook-secret", default="whsec_loadtest")
+    parser.add_argument("--run-id", type=int, default=random.randrange(100000), help="keeps mobile numbers unique across runs")
+    parser.add_argument("--json-out", help="write the summary here")
+    parser.add_argument("--baseline", help="summary from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed p95 growth over the baseline")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="allowed error rate on the core journey routes")
+    parser.add_argument("--verbose", action="store_true")
+
+def report(summary: dict, args: argparse.Namespace) -> int:
+    print_report(summary)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(summary, f, indent=2)
+    exit_code = 0
+    failures = check_core_routes(summary, args.max_error_rate)
+    if failures:
+        print("\nCore routes failing:")
+        for line in failures:
+            print(f"  {line}")
+        exit_code = 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(summary, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            exit_code = 1
+        else:
+            print("\nNo regressions against baseline.")
+    return exit_code
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test driver for the chat API")
+    add_arguments(parser)
+    args = parser.parse_args()
+    summary = asyncio.run(run(args))
+    sys.exit(report(summary, args))
+
+if __name__ == "__main__":
+    main()
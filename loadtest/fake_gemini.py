@@ -0,0 +1,129 @@
+"""Stand-in for the Gemini REST API.
+
+Serves ``generateContent`` and ``streamGenerateContent`` with configurable
+latency and error rates. Point the app at it with the REST transport:
+
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8001
+"""
+import argparse
+import asyncio
+import json
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+config = {
+    "latency_ms": 800.0,
+    "jitter_ms": 200.0,
+    "first_token_ms": 300.0,
+    "error_rate": 0.0,
+    "throttle_rate": 0.0,
+    "stream_chunks": 8,
+    "reply_words": 60,
+}
+
+app = FastAPI()
+
+WORDS = (
+    "the quick model considers your question carefully and answers with a short "
+    "paragraph about systems latency queues caching and the trade offs involved"
+).split()
+
+def _latency(mean_ms: float) -> float:
+    return max(random.gauss(mean_ms, config["jitter_ms"]), 0) / 1000
+
+def _failure():
+    roll = random.random()
+    if roll < config["throttle_rate"]:
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}},
+        )
+    if roll < config["throttle_rate"] + config["error_rate"]:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"code": 500, "message": "Internal error", "status": "INTERNAL"}},
+        )
+    return None
+
+def _prompt_chars(body: dict) -> int:
+    return sum(len(part.get("text", "")) for content in body.get("contents", []) for part in content.get("parts", []))
+
+def _chunk(text: str, body: dict, finished: bool) -> dict:
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    prompt_tokens = _prompt_chars(body) // 4
+    reply_tokens = config["reply_words"]
+    return {
+        "candidates": [candidate],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": reply_tokens,
+            "totalTokenCount": prompt_tokens + reply_tokens,
+        },
+    }
+
+def _reply_words():
+    return [random.choice(WORDS) for _ in range(config["reply_words"])]
+
+@app.post("/{version}/models/{model_action}")
+async def models(version: str, model_action: str, request: Request):
+    _, _, action = model_action.partition(":")
+    body = await request.json()
+
+    failure = _failure()
+    if failure is not None:
+        await asyncio.sleep(_latency(config["first_token_ms"]))
+        return failure
+
+    words = _reply_words()
+    if action == "generateContent":
+        await asyncio.sleep(_latency(config["latency_ms"]))
+        return _chunk(" ".join(words), body, finished=True)
+
+    if action == "streamGenerateContent":
+        chunks = max(config["stream_chunks"], 1)
+        size = max(len(words) // chunks, 1)
+        pieces = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        sse = request.query_params.get("alt") == "sse"
+
+        async def stream():
+            await asyncio.sleep(_latency(config["first_token_ms"]))
+            spread = max(config["latency_ms"] - config["first_token_ms"], 0) / 1000 / len(pieces)
+            if not sse:
+                yield "["
+            for i, piece in enumerate(pieces):
+                payload = json.dumps(_chunk(piece, body, finished=i == len(pieces) - 1))
+                if sse:
+                    yield f"data: {payload}\r\n\r\n"
+                else:
+                    yield ("," if i else "") + payload
+                await asyncio.sleep(spread)
+            if not sse:
+                yield "]"
+
+        return StreamingResponse(stream(), media_type="text/event-stream" if sse else "application/json")
+
+    return JSONResponse(status_code=404, content={"error": {"code": 404, "message": f"Unknown action {action}"}})
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini REST server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"], help="mean time to a full reply")
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"])
+    parser.add_argument("--first-token-ms", type=float, default=config["first_token_ms"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"], help="fraction of 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=config["throttle_rate"], help="fraction of 429 responses")
+    parser.add_argument("--stream-chunks", type=int, default=config["stream_chunks"])
+    parser.add_argument("--reply-words", type=int, default=config["reply_words"])
+    args = parser.parse_args()
+    for key in config:
+        config[key] = getattr(args, key)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
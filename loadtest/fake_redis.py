@@ -0,0 +1,48 @@
+"""In-memory Redis speaking the wire protocol, for runs without a Redis server.
+
+Backed by fakeredis' TCP server, so the API, the Celery broker and workers all
+connect to it unchanged. Lua scripts (rate limiting, admission, caches) need
+``fakeredis[lua]``. Good enough for smoke runs; use a real Redis for numbers
+you intend to compare.
+"""
+import argparse
+
+def _keep_alive_on_errors(handler_class):
+    # fakeredis' TCP handler closes the socket after any error reply. redis-py
+    # runs scripts with EVALSHA and loads them on NOSCRIPT over the same
+    # connection, so every first script call failed with "Connection closed
+    # by server". Hand command errors back as replies instead.
+    from redis.exceptions import ResponseError
+
+    class Handler(handler_class):
+        def setup(self):
+            super().setup()
+            read_response = self.current_client.read_response
+
+            def read_reply(**kwargs):
+                try:
+                    return read_response(**kwargs)
+                except ResponseError as e:
+                    return e
+
+            self.current_client.read_response = read_reply
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Redis TCP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer((args.host, args.port))
+    server.RequestHandlerClass = _keep_alive_on_errors(server.RequestHandlerClass)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Stand-in for the Stripe API plus a signed webhook generator.
+
+The API side answers the calls PaymentService makes (customers, checkout
+sessions, subscription lookups); point the app at it with
+``STRIPE_API_BASE=http://127.0.0.1:8002``. The helpers below build events and
+sign them the way Stripe does, so they pass ``stripe.Webhook.construct_event``.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from typing import Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+app = FastAPI()
+
+PERIOD_SECONDS = 30 * 86400
+
+def _id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+@app.post("/v1/customers")
+async def create_customer():
+    return {"id": _id("cus"), "object": "customer"}
+
+@app.post("/v1/checkout/sessions")
+async def create_checkout_session():
+    session_id = _id("cs_test")
+    return {"id": session_id, "object": "checkout.session", "url": f"https://checkout.stripe.test/{session_id}"}
+
+@app.get("/v1/subscriptions/{subscription_id}")
+async def retrieve_subscription(subscription_id: str):
+    return {
+        "id": subscription_id,
+        "object": "subscription",
+        "status": "active",
+        "current_period_end": int(time.time()) + PERIOD_SECONDS,
+    }
+
+def sign_payload(payload: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+def build_event(event_type: str, data_object: dict, event_id: Optional[str] = None) -> dict:
+    return {
+        "id": event_id or _id("evt"),
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "livemode": False,
+        "data": {"object": data_object},
+    }
+
+def checkout_completed(user_id: int, customer_id: Optional[str] = None, subscription_id: Optional[str] = None) -> dict:
+    return build_event("checkout.session.completed", {
+        "object": "checkout.session",
+        "customer": customer_id or _id("cus"),
+        "subscription": subscription_id or _id("sub"),
+        "metadata": {"user_id": str(user_id)},
+    })
+
+def invoice_payment_succeeded(subscription_id: str) -> dict:
+    return build_event("invoice.payment_succeeded", {"object": "invoice", "subscription": subscription_id})
+
+def subscription_deleted(subscription_id: str) -> dict:
+    return build_event("customer.subscription.deleted", {"object": "subscription", "id": subscription_id})
+
+async def send_webhook(client: httpx.AsyncClient, url: str, event: dict, secret: str) -> httpx.Response:
+    payload = json.dumps(event).encode()
+    return await client.post(
+        url,
+        content=payload,
+        headers={"Content-Type": "application/json", "Stripe-Signature": sign_payload(payload, secret)},
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Stripe API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
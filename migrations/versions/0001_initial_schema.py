@@ -0,0 +1,102 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("mobile_number", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("role", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_mobile_number", "users", ["mobile_number"], unique=True)
+
+    op.create_table(
+        "chatrooms",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index("ix_chatrooms_id", "chatrooms", ["id"])
+    op.create_index("ix_chatrooms_name", "chatrooms", ["name"])
+
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("chatroom_id", sa.Integer(), sa.ForeignKey("chatrooms.id"), nullable=True),
+        sa.Column("sender", sa.String(), nullable=False),
+        sa.Column("content", sa.String(), nullable=False),
+        sa.Column("sent_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index("ix_messages_id", "messages", ["id"])
+
+    op.create_table(
+        "otps",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("mobile_number", sa.String(), nullable=False),
+        sa.Column("otp_code", sa.String(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("is_verified", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index("ix_otps_id", "otps", ["id"])
+    op.create_index("ix_otps_mobile_number", "otps", ["mobile_number"])
+
+    op.create_table(
+        "subscriptions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("stripe_customer_id", sa.String(), nullable=True),
+        sa.Column("stripe_subscription_id", sa.String(), nullable=True),
+        sa.Column("tier", sa.String(), nullable=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("current_period_end", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.UniqueConstraint("user_id"),
+        sa.UniqueConstraint("stripe_customer_id"),
+        sa.UniqueConstraint("stripe_subscription_id"),
+    )
+    op.create_index("ix_subscriptions_id", "subscriptions", ["id"])
+
+    op.create_table(
+        "daily_usage",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("date", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("prompt_count", sa.Integer(), nullable=True),
+    )
+    op.create_index("ix_daily_usage_id", "daily_usage", ["id"])
+
+def downgrade():
+    op.drop_index("ix_daily_usage_id", table_name="daily_usage")
+    op.drop_table("daily_usage")
+    op.drop_index("ix_subscriptions_id", table_name="subscriptions")
+    op.drop_table("subscriptions")
+    op.drop_index("ix_otps_mobile_number", table_name="otps")
+    op.drop_index("ix_otps_id", table_name="otps")
+    op.drop_table("otps")
+    op.drop_index("ix_messages_id", table_name="messages")
+    op.drop_table("messages")
+    op.drop_index("ix_chatrooms_name", table_name="chatrooms")
+    op.drop_index("ix_chatrooms_id", table_name="chatrooms")
+    op.drop_table("chatrooms")
+    op.drop_index("ix_users_mobile_number", table_name="users")
+    op.drop_index("ix_users_id", table_name="users")
+    op.drop_table("users")
@@ -0,0 +1,30 @@
+"""index messages by chatroom for keyset history
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Build the index without holding a write lock on messages.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_messages_chatroom_id_id",
+            "messages",
+            ["chatroom_id", "id"],
+            postgresql_concurrently=True,
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_messages_chatroom_id_id",
+            table_name="messages",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,41 @@
+"""one daily_usage row per user and day
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Concurrent first prompts could each insert a row for the same day. Fold
+    # them into the oldest row, keeping every counted prompt, before the
+    # constraint is added.
+    op.execute(
+        """
+        UPDATE daily_usage SET prompt_count = duplicates.total
+        FROM (
+            SELECT min(id) AS id, sum(COALESCE(prompt_count, 0)) AS total
+            FROM daily_usage
+            GROUP BY user_id, date
+            HAVING count(*) > 1
+        ) AS duplicates
+        WHERE daily_usage.id = duplicates.id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM daily_usage USING daily_usage AS kept
+        WHERE daily_usage.user_id = kept.user_id
+          AND daily_usage.date = kept.date
+          AND daily_usage.id > kept.id
+        """
+    )
+    op.create_unique_constraint("uq_daily_usage_user_date", "daily_usage", ["user_id", "date"])
+
+def downgrade():
+    op.drop_constraint("uq_daily_usage_user_date", "daily_usage", type_="unique")
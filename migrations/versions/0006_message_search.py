@@ -0,0 +1,45 @@
+"""full-text search on messages
+
+Revision ID: 0002
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.core.config import settings
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.add_column("messages", sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True))
+    # Same text search config the app writes and queries with, or old rows would not match.
+    op.execute(
+        sa.text(
+            "UPDATE messages SET search_vector = to_tsvector(CAST(:config AS regconfig), content) "
+            "WHERE search_vector IS NULL"
+        ).bindparams(config=settings.SEARCH_TEXT_CONFIG)
+    )
+    # Build the index without holding a write lock on messages.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_messages_chatroom_id_search_vector",
+            "messages",
+            ["chatroom_id", "search_vector"],
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_messages_chatroom_id_search_vector",
+            table_name="messages",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("messages", "search_vector")
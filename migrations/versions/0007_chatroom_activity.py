@@ -0,0 +1,51 @@
+"""chatroom activity columns
+
+Revision ID: 0003
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("chatrooms", sa.Column("last_message_at", sa.DateTime(), server_default=sa.func.now(), nullable=False))
+    op.add_column("chatrooms", sa.Column("last_message_preview", sa.String(), nullable=True))
+    op.add_column("chatrooms", sa.Column("message_count", sa.Integer(), server_default="0", nullable=False))
+    op.execute(
+        """
+        UPDATE chatrooms SET
+            last_message_at = COALESCE(stats.last_message_at, chatrooms.created_at, now()),
+            message_count = stats.message_count,
+            last_message_preview = left(latest.content, 120)
+        FROM (
+            SELECT chatroom_id, max(sent_at) AS last_message_at, count(*) AS message_count, max(id) AS last_id
+            FROM messages GROUP BY chatroom_id
+        ) AS stats
+        JOIN messages AS latest ON latest.id = stats.last_id
+        WHERE chatrooms.id = stats.chatroom_id
+        """
+    )
+    op.execute("UPDATE chatrooms SET last_message_at = created_at WHERE message_count = 0 AND created_at IS NOT NULL")
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_chatrooms_user_id_last_message_at",
+            "chatrooms",
+            ["user_id", sa.text("last_message_at DESC"), sa.text("id DESC")],
+            postgresql_concurrently=True,
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_chatrooms_user_id_last_message_at",
+            table_name="chatrooms",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("chatrooms", "message_count")
+    op.drop_column("chatrooms", "last_message_preview")
+    op.drop_column("chatrooms", "last_message_at")
@@ -0,0 +1,140 @@
+"""partition messages by month and add message archives
+
+Revision ID: 0004
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+def upgrade():
+    # Rebuild messages as a monthly range-partitioned table. The id sequence
+    # moves to the new table, so ids keep increasing across the switch.
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY NONE")
+    op.execute(
+        """
+        CREATE TABLE messages_partitioned (
+            id integer NOT NULL DEFAULT nextval('messages_id_seq'),
+            chatroom_id integer REFERENCES chatrooms (id),
+            sender varchar NOT NULL,
+            content varchar NOT NULL,
+            sent_at timestamp NOT NULL DEFAULT now(),
+            search_vector tsvector,
+            PRIMARY KEY (id, sent_at)
+        ) PARTITION BY RANGE (sent_at)
+        """
+    )
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+            month date;
+            last_month date := date_trunc('month', now()) + interval '{MONTHS_AHEAD} months';
+        BEGIN
+            month := date_trunc('month', COALESCE((SELECT min(sent_at) FROM messages), now()));
+            WHILE month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF messages_partitioned FOR VALUES FROM (%L) TO (%L)',
+                    'messages_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+                    month,
+                    month + interval '1 month'
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END $$
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO messages_partitioned (id, chatroom_id, sender, content, sent_at, search_vector)
+        SELECT id, chatroom_id, sender, content, COALESCE(sent_at, now()), search_vector FROM messages
+        """
+    )
+    op.drop_table("messages")
+    op.execute("ALTER TABLE messages_partitioned RENAME TO messages")
+    op.execute("ALTER TABLE messages RENAME CONSTRAINT messages_partitioned_pkey TO messages_pkey")
+    op.execute("ALTER TABLE messages RENAME CONSTRAINT messages_partitioned_chatroom_id_fkey TO messages_chatroom_id_fkey")
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+
+    # Indexes on the parent are created on every partition, present and future.
+    op.create_index("ix_messages_id", "messages", ["id"])
+    op.create_index("ix_messages_chatroom_id_id", "messages", ["chatroom_id", "id"])
+    op.create_index(
+        "ix_messages_chatroom_id_search_vector",
+        "messages",
+        ["chatroom_id", "search_vector"],
+        postgresql_using="gin",
+    )
+
+    op.create_table(
+        "message_archives",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("partition_name", sa.String(), nullable=False),
+        sa.Column("period_start", sa.DateTime(), nullable=False),
+        sa.Column("period_end", sa.DateTime(), nullable=False),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("row_count", sa.Integer(), nullable=False),
+        sa.Column("size_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.UniqueConstraint("partition_name"),
+    )
+    op.create_index("ix_message_archives_id", "message_archives", ["id"])
+
+    op.create_table(
+        "message_archive_chatrooms",
+        sa.Column("archive_id", sa.Integer(), sa.ForeignKey("message_archives.id"), primary_key=True),
+        sa.Column("chatroom_id", sa.Integer(), primary_key=True),
+        sa.Column("min_id", sa.Integer(), nullable=False),
+        sa.Column("max_id", sa.Integer(), nullable=False),
+        sa.Column("message_count", sa.Integer(), nullable=False),
+    )
+    op.create_index(
+        "ix_message_archive_chatrooms_chatroom_id_max_id",
+        "message_archive_chatrooms",
+        ["chatroom_id", "max_id"],
+    )
+
+def downgrade():
+    # Archived months are not restored; their Parquet files stay on disk.
+    op.drop_index("ix_message_archive_chatrooms_chatroom_id_max_id", table_name="message_archive_chatrooms")
+    op.drop_table("message_archive_chatrooms")
+    op.drop_index("ix_message_archives_id", table_name="message_archives")
+    op.drop_table("message_archives")
+
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+    op.execute("ALTER INDEX ix_messages_id RENAME TO ix_messages_partitioned_id")
+    op.execute("ALTER INDEX ix_messages_chatroom_id_id RENAME TO ix_messages_partitioned_chatroom_id_id")
+    op.execute("ALTER INDEX ix_messages_chatroom_id_search_vector RENAME TO ix_messages_partitioned_chatroom_id_search_vector")
+    op.execute("ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_pkey TO messages_partitioned_pkey")
+    op.execute("ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_chatroom_id_fkey TO messages_partitioned_chatroom_id_fkey")
+    op.execute(
+        """
+        CREATE TABLE messages (
+            id integer PRIMARY KEY DEFAULT nextval('messages_id_seq'),
+            chatroom_id integer REFERENCES chatrooms (id),
+            sender varchar NOT NULL,
+            content varchar NOT NULL,
+            sent_at timestamp DEFAULT now(),
+            search_vector tsvector
+        )
+        """
+    )
+    op.execute("INSERT INTO messages SELECT id, chatroom_id, sender, content, sent_at, search_vector FROM messages_partitioned")
+    op.execute("DROP TABLE messages_partitioned CASCADE")
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.create_index("ix_messages_id", "messages", ["id"])
+    op.create_index("ix_messages_chatroom_id_id", "messages", ["chatroom_id", "id"])
+    op.create_index(
+        "ix_messages_chatroom_id_search_vector",
+        "messages",
+        ["chatroom_id", "search_vector"],
+        postgresql_using="gin",
+    )
@@ -0,0 +1,52 @@
+import os
+import tempfile
+
+# Settings are read at import time, so the environment is set before any app import.
+_db_path = os.path.join(tempfile.mkdtemp(prefix="kuvaka-tests-"), "test.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_db_path}")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_dummy")
+os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_test")
+os.environ.setdefault("STRIPE_PUBLISHABLE_KEY", "pk_test_dummy")
+os.environ.setdefault("STRIPE_PRO_PRODUCT_ID", "prod_test")
+os.environ.setdefault("STRIPE_PRO_PRICE_ID", "price_test")
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+
+import fakeredis
+import pytest
+
+from app.db import models  # noqa: F401  (registers the tables on Base.metadata)
+from app.db.base import Base
+from app.db.session import async_session, engine
+from app.utils import cache
+
+@pytest.fixture
+async def redis_client():
+    # In-process Redis with Lua support (lupa), swapped in for the shared client.
+    client = fakeredis.FakeAsyncRedis()
+    previous = cache.redis_client
+    cache.redis_client = client
+    cache.local_cache.clear()
+    try:
+        yield client
+    finally:
+        cache.redis_client = previous
+        cache.local_cache.clear()
+        await client.aclose()
+
+@pytest.fixture
+async def db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        async with async_session() as session:
+            yield session
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        # Pooled connections belong to this test's event loop.
+        await engine.dispose()
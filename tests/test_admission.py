@@ -0,0 +1,59 @@
+import httpx
+import pytest
+
+from app.api import chatroom as chatroom_api
+from app.api.dependencies import get_token_user
+from app.core.config import settings
+from app.core.exceptions import ServiceOverloadedException, TooManyInFlightException
+from app.db.models import User
+from app.main import app
+from app.utils.admission import admit_ai_job, release_ai_job
+
+async def test_admits_until_the_chatroom_limit(redis_client):
+    ticket = await admit_ai_job(1, "basic", 10)
+    with pytest.raises(TooManyInFlightException) as excinfo:
+        await admit_ai_job(1, "basic", 10)
+    assert excinfo.value.headers["Retry-After"] == str(settings.ADMISSION_RETRY_AFTER_SECONDS)
+
+    await release_ai_job(ticket)
+    await admit_ai_job(1, "basic", 10)
+
+async def test_per_user_limit_spans_chatrooms(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_PER_USER", 2)
+    await admit_ai_job(1, "basic", 10)
+    await admit_ai_job(1, "basic", 11)
+    with pytest.raises(TooManyInFlightException):
+        await admit_ai_job(1, "basic", 12)
+    await admit_ai_job(2, "basic", 13)
+
+async def test_basic_tier_is_shed_before_pro(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_OUTSTANDING", 2)
+    monkeypatch.setattr(settings, "ADMISSION_BASIC_SHARE", 0.5)
+    await admit_ai_job(1, "basic", 10)
+    with pytest.raises(ServiceOverloadedException):
+        await admit_ai_job(2, "basic", 11)
+    await admit_ai_job(3, "pro", 12)
+
+async def test_expired_leases_are_reclaimed(redis_client, monkeypatch):
+    # A job whose worker died never releases its ticket; its lease runs out instead.
+    monkeypatch.setattr(settings, "ADMISSION_JOB_LEASE_SECONDS", -1)
+    await admit_ai_job(1, "basic", 10)
+    monkeypatch.setattr(settings, "ADMISSION_JOB_LEASE_SECONDS", 300)
+    await admit_ai_job(1, "basic", 10)
+
+async def test_rejected_send_returns_429_with_retry_after(redis_client, monkeypatch):
+    async def basic_tier(user_id, fallback=None):
+        return "basic"
+
+    monkeypatch.setattr(chatroom_api, "get_subscription_tier", basic_tier)
+    app.dependency_overrides[get_token_user] = lambda: User(id=1, role="basic")
+    try:
+        await admit_ai_job(1, "basic", 10)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/chatroom/10/message", json={"content": "hello"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == str(settings.ADMISSION_RETRY_AFTER_SECONDS)
@@ -0,0 +1,81 @@
+import asyncio
+
+from app.utils import cache
+from app.utils.cache import get_or_set, invalidate_cache, pack_value, unpack_value
+
+class CountingLoader:
+    def __init__(self, value, delay: float = 0.0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+def test_pack_round_trip():
+    expires_at, compute_time, value = unpack_value(pack_value({"a": [1, 2]}, ttl=60, compute_time=0.25))
+    assert value == {"a": [1, 2]}
+    assert compute_time == 0.25
+
+    _, _, body = unpack_value(pack_value(b'{"raw":true}', ttl=60, raw=True), raw=True)
+    assert body == b'{"raw":true}'
+
+async def test_miss_loads_once_then_hits(redis_client):
+    loader = CountingLoader({"rooms": 3})
+    assert await get_or_set("chatrooms_user_1", loader, ttl=60) == {"rooms": 3}
+    assert await get_or_set("chatrooms_user_1", loader, ttl=60) == {"rooms": 3}
+    assert loader.calls == 1
+
+    # A second process sees the Redis copy without loading.
+    cache.local_cache.clear()
+    assert await get_or_set("chatrooms_user_1", loader, ttl=60) == {"rooms": 3}
+    assert loader.calls == 1
+
+async def test_concurrent_misses_share_one_load(redis_client):
+    loader = CountingLoader([1, 2, 3], delay=0.05)
+    results = await asyncio.gather(*(get_or_set("hot_key", loader, ttl=60) for _ in range(20)))
+    assert results == [[1, 2, 3]] * 20
+    assert loader.calls == 1
+
+async def test_failed_load_is_not_cached(redis_client):
+    async def broken():
+        raise RuntimeError("db down")
+
+    for _ in range(2):
+        try:
+            await get_or_set("broken_key", broken, ttl=60)
+        except RuntimeError:
+            pass
+    assert await redis_client.get("broken_key") is None
+    assert await get_or_set("broken_key", CountingLoader("ok"), ttl=60) == "ok"
+
+async def test_near_expiry_value_is_refreshed_early(redis_client, monkeypatch):
+    # Expiring in one second with a 10s compute time: XFetch refreshes it ahead of expiry.
+    await redis_client.set("slow_key", pack_value("old", ttl=1, compute_time=10.0))
+    monkeypatch.setattr(cache.random, "random", lambda: 0.5)
+    loader = CountingLoader("new")
+    assert await get_or_set("slow_key", loader, ttl=60) == "new"
+    assert loader.calls == 1
+
+async def test_fresh_cheap_value_is_not_refreshed(redis_client, monkeypatch):
+    await redis_client.set("cheap_key", pack_value("cached", ttl=3600, compute_time=0.001))
+    monkeypatch.setattr(cache.random, "random", lambda: 0.5)
+    loader = CountingLoader("new")
+    assert await get_or_set("cheap_key", loader, ttl=60) == "cached"
+    assert loader.calls == 0
+
+async def test_stale_value_served_while_another_process_recomputes(redis_client, monkeypatch):
+    await redis_client.set("busy_key", pack_value("stale", ttl=1, compute_time=10.0))
+    await redis_client.set("lock:busy_key", "other-process")
+    monkeypatch.setattr(cache.random, "random", lambda: 0.5)
+    loader = CountingLoader("new")
+    assert await get_or_set("busy_key", loader, ttl=60) == "stale"
+    assert loader.calls == 0
+
+async def test_invalidate_drops_both_tiers(redis_client):
+    await get_or_set("user_1", CountingLoader({"id": 1}), ttl=60)
+    await invalidate_cache("user_1")
+    assert cache.local_cache.get("user_1") is None
+    assert await redis_client.get("user_1") is None
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from app.api.dependencies import get_token_user
+from app.db.models import Chatroom, User
+from app.db.session import get_db
+from app.main import app
+from app.services.chatroom_service import chatroom_list_key
+
+@pytest.fixture
+async def user_id(db) -> int:
+    user = User(mobile_number="+910000000001", hashed_password="x")
+    db.add(user)
+    await db.flush()
+    started = datetime(2026, 1, 1)
+    db.add_all([
+        Chatroom(name=f"room {i}", user_id=user.id, last_message_at=started + timedelta(minutes=i))
+        for i in range(3)
+    ])
+    user_id = user.id
+    await db.commit()
+    return user_id
+
+@pytest.fixture
+async def client(db, user_id, redis_client):
+    async def same_session():
+        yield db
+
+    app.dependency_overrides[get_token_user] = lambda: User(id=user_id, role="basic")
+    app.dependency_overrides[get_db] = same_session
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+
+def test_list_key_is_versioned():
+    # The cached value is the serialized ChatroomPage; older layouts used chatrooms_user_{id}.
+    assert chatroom_list_key(42) == "chatrooms_v2_user_42"
+
+async def test_first_page_is_cached(client, user_id, redis_client):
+    first = await client.get("/api/chatroom")
+    assert first.status_code == 200
+    assert [room["name"] for room in first.json()["chatrooms"]] == ["room 2", "room 1", "room 0"]
+    assert await redis_client.exists(chatroom_list_key(user_id))
+
+async def test_other_pages_are_not_cached(client, user_id, redis_client):
+    page = (await client.get("/api/chatroom", params={"limit": 2})).json()
+    assert page["has_more"]
+    rest = (await client.get("/api/chatroom", params={"limit": 2, "cursor": page["next_cursor"]})).json()
+
+    assert [room["name"] for room in page["chatrooms"] + rest["chatrooms"]] == ["room 2", "room 1", "room 0"]
+    assert not rest["has_more"]
+    assert not await redis_client.exists(chatroom_list_key(user_id))
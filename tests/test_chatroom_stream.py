@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from app.api import chatroom as chatroom_api
+from app.db.models import Message
+from app.utils.admission import admit_ai_job, release_ai_job
+
+class FakeGemini:
+    async def stream_gemini_response(self, prompt, chat_history):
+        for chunk in ("Hello", " there", " friend"):
+            yield chunk
+
+def _user_message() -> Message:
+    return Message(id=1, chatroom_id=10, sender="user", content="hi", sent_at=datetime(2026, 1, 1))
+
+async def test_disconnect_keeps_the_partial_reply(monkeypatch):
+    saved = []
+
+    async def save(chatroom_id, content):
+        await asyncio.sleep(0)
+        saved.append((chatroom_id, content))
+
+    monkeypatch.setattr(chatroom_api, "get_gemini_service", lambda: FakeGemini())
+    monkeypatch.setattr(chatroom_api, "_save_ai_message", save)
+
+    events = chatroom_api._stream_ai_events(10, _user_message(), "hi", [])
+    assert (await events.__anext__()).startswith("event: message")
+    assert (await events.__anext__()).startswith("event: delta")
+    await events.aclose()
+
+    # The save is tracked until it completes, then forgotten.
+    assert len(chatroom_api._background_saves) == 1
+    await asyncio.gather(*chatroom_api._background_saves)
+    await asyncio.sleep(0)
+    assert saved == [(10, "Hello")]
+    assert not chatroom_api._background_saves
+
+async def test_failed_background_save_is_logged(monkeypatch, capsys):
+    async def save(chatroom_id, content):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(chatroom_api, "_save_ai_message", save)
+    task = chatroom_api._save_in_background(10, "partial")
+    await asyncio.gather(task, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert "database down" in capsys.readouterr().out
+    assert not chatroom_api._background_saves
+
+async def chatroom_jobs(redis_client) -> int:
+    return await redis_client.zcard("admission:jobs:chatroom:10")
+
+def _stream_response(ticket: dict, started: list):
+    async def body():
+        started.append(True)
+        yield "event: message\ndata: {}\n\n"
+
+    return chatroom_api._AdmittedStreamingResponse(body(), ticket, media_type="text/event-stream")
+
+async def test_ticket_released_when_client_leaves_before_the_body(redis_client):
+    ticket = await admit_ai_job(1, "pro", 10)
+    started = []
+
+    async def send(message):
+        raise OSError("connection reset")
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    with pytest.raises(ClientDisconnect):
+        await _stream_response(ticket, started)(scope, receive, send)
+
+    assert not started
+    assert await chatroom_jobs(redis_client) == 0
+
+async def test_ticket_released_when_disconnect_cancels_the_stream(redis_client):
+    ticket = await admit_ai_job(1, "pro", 10)
+    started = []
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+        await asyncio.sleep(1)
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    await _stream_response(ticket, started)({"type": "http"}, receive, send)
+
+    assert not started
+    assert await chatroom_jobs(redis_client) == 0
+
+async def test_ticket_released_after_a_full_stream(redis_client):
+    ticket = await admit_ai_job(1, "pro", 10)
+    started = []
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        await asyncio.sleep(10)
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    await _stream_response(ticket, started)(scope, receive, send)
+
+    assert started
+    assert sent[-1] == {"type": "http.response.body", "body": b"", "more_body": False}
+    assert await chatroom_jobs(redis_client) == 0
+    # Releasing twice is harmless.
+    await release_ai_job(ticket)
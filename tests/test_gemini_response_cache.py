@@ -0,0 +1,49 @@
+from prometheus_client import REGISTRY
+
+from app.core.config import settings
+from app.services import gemini_response_cache
+from app.services.gemini_response_cache import INDEX_KEY, cache_response, get_cached_response, response_cache_key
+
+def cache_count(result: str) -> float:
+    return REGISTRY.get_sample_value(
+        "cache_requests_total", {"cache": "gemini_response", "result": result}
+    ) or 0.0
+
+def test_key_ignores_whitespace_differences():
+    history = [{"role": "user", "content": "hi  there"}]
+    a = response_cache_key("gemini", {}, history, "What is  Redis?")
+    b = response_cache_key("gemini", {}, [{"role": "user", "content": "hi there"}], " What is Redis? ")
+    assert a == b
+    assert a != response_cache_key("gemini", {"temperature": 0.2}, history, "What is Redis?")
+
+async def test_hits_and_misses_are_counted(redis_client):
+    key = response_cache_key("gemini", {}, [], "hello")
+    hits, misses = cache_count("hit"), cache_count("miss")
+
+    assert await get_cached_response(key) is None
+    await cache_response(key, "Hi!")
+    assert await get_cached_response(key) == "Hi!"
+
+    assert cache_count("miss") == misses + 1
+    assert cache_count("hit") == hits + 1
+
+async def test_oversized_response_bypasses_cache(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_RESPONSE_CACHE_MAX_BYTES", 4)
+    key = response_cache_key("gemini", {}, [], "hello")
+    bypasses = cache_count("bypass")
+
+    await cache_response(key, "too long")
+
+    assert cache_count("bypass") == bypasses + 1
+    assert await redis_client.exists(key) == 0
+
+async def test_entry_cap_evicts_oldest(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_RESPONSE_CACHE_MAX_ENTRIES", 2)
+    keys = [response_cache_key("gemini", {}, [], f"prompt {i}") for i in range(3)]
+    for now, key in enumerate(keys, start=1000):
+        monkeypatch.setattr(gemini_response_cache.time, "time", lambda now=now: now)
+        await cache_response(key, "answer")
+
+    assert await redis_client.zcard(INDEX_KEY) == 2
+    assert await get_cached_response(keys[0]) is None
+    assert await get_cached_response(keys[2]) == "answer"
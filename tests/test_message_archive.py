@@ -0,0 +1,182 @@
+import os
+import subprocess
+import sys
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import event, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.models import Chatroom, Message, MessageArchive, MessageArchiveChatroom, User
+from app.db.partitions import add_months, list_message_partitions, partition_name
+from app.db.session import engine
+from app.services.archive_service import ArchiveService, archive_path, get_pyarrow, _archive_schema
+from app.services.chatroom_service import ChatroomService
+
+TEST_POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+async def make_room(session) -> int:
+    user = User(mobile_number="+15550000001", hashed_password="x")
+    session.add(user)
+    await session.flush()
+    room = Chatroom(name="history", user_id=user.id)
+    session.add(room)
+    await session.flush()
+    return room.id
+
+async def add_messages(session, chatroom_id: int, count: int, sent_at=None) -> list:
+    values = {"sent_at": sent_at} if sent_at is not None else {}
+    messages = [Message(chatroom_id=chatroom_id, sender="user", content=f"message {n}", **values) for n in range(count)]
+    session.add_all(messages)
+    await session.commit()
+    return [message.id for message in messages]
+
+def write_archive(file_name: str, rows: list):
+    pa = get_pyarrow()
+    os.makedirs(settings.MESSAGE_ARCHIVE_DIR, exist_ok=True)
+    columns = {column: [row[column] for row in rows] for column in ["id", "chatroom_id", "sender", "content", "sent_at"]}
+    pa.parquet.write_table(pa.Table.from_pydict(columns, schema=_archive_schema()), archive_path(file_name))
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MESSAGE_ARCHIVE_DIR", str(tmp_path))
+    return tmp_path
+
+async def test_history_skips_the_archive_when_the_room_has_none(db, redis_client):
+    chatroom_id = await make_room(db)
+    ids = await add_messages(db, chatroom_id, 3)
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        service = ChatroomService(db)
+        # A short page back and a forward poll are the two paths that used to read archives.
+        messages, has_more = await service.get_messages(chatroom_id, limit=10)
+        assert [message.id for message in messages] == ids and not has_more
+        messages, _ = await service.get_messages(chatroom_id, after=ids[0], limit=10)
+        assert [message.id for message in messages] == ids[1:]
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    assert not [statement for statement in statements if "message_archive" in statement]
+
+async def test_history_merges_archived_and_hot_rows(db, redis_client, archive_dir, monkeypatch):
+    chatroom_id = await make_room(db)
+    hot = await add_messages(db, chatroom_id, 3)
+    # Archived ids sit below the hot rows; 1 and 2 are still in Postgres too,
+    # as they are while a partition is being archived.
+    archived_ids = list(range(-4, 0)) + hot[:1]
+    write_archive("messages_y2020m01.parquet", [
+        {"id": message_id, "chatroom_id": chatroom_id, "sender": "user", "content": f"old {message_id}", "sent_at": datetime(2020, 1, 1)}
+        for message_id in archived_ids
+    ])
+    archive = MessageArchive(partition_name="messages_y2020m01", period_start=date(2020, 1, 1), period_end=date(2020, 2, 1),
+                             path="messages_y2020m01.parquet", row_count=len(archived_ids), size_bytes=0)
+    db.add(archive)
+    await db.flush()
+    await db.execute(insert(MessageArchiveChatroom).values(
+        archive_id=archive.id, chatroom_id=chatroom_id, min_id=archived_ids[0], max_id=archived_ids[-1], message_count=len(archived_ids)
+    ))
+    await db.commit()
+
+    # Archives only exist on partitioned Postgres; the read path itself is the same.
+    async def archive_range(self, room_id):
+        return (archived_ids[0], archived_ids[-1]) if room_id == chatroom_id else None
+    monkeypatch.setattr(ArchiveService, "get_archive_range", archive_range)
+
+    service = ChatroomService(db)
+    messages, has_more = await service.get_messages(chatroom_id, limit=5)
+    assert [message.id for message in messages] == [-2, -1] + hot and has_more
+    messages, has_more = await service.get_messages(chatroom_id, before=-2, limit=5)
+    assert [message.id for message in messages] == [-4, -3] and not has_more
+
+    messages, has_more = await service.get_messages(chatroom_id, after=-3, limit=3)
+    assert [message.id for message in messages] == [-2, -1, hot[0]] and has_more
+    messages, has_more = await service.get_messages(chatroom_id, after=-1, limit=10)
+    assert [message.id for message in messages] == hot and not has_more
+
+    # Past the newest archived id, the archive is not read at all.
+    monkeypatch.setattr(ArchiveService, "get_messages", None)
+    messages, _ = await service.get_messages(chatroom_id, after=hot[0], limit=10)
+    assert [message.id for message in messages] == hot[1:]
+
+# The archive job itself needs partitioned Postgres. Point TEST_POSTGRES_URL at
+# a throwaway database (postgresql+asyncpg://...); its public schema is reset.
+postgres_only = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+@pytest.fixture
+async def pg_session():
+    pg_engine = create_async_engine(TEST_POSTGRES_URL)
+    async with pg_engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA public CASCADE"))
+        await conn.execute(text("CREATE SCHEMA public"))
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        env={**os.environ, "DATABASE_URL": TEST_POSTGRES_URL},
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        check=True,
+    )
+    try:
+        async with sessionmaker(pg_engine, class_=AsyncSession, expire_on_commit=False)() as session:
+            yield session
+    finally:
+        await pg_engine.dispose()
+
+@postgres_only
+async def test_archive_partition_moves_a_month_to_parquet(pg_session, redis_client, archive_dir):
+    month = date(2020, 1, 1)
+    name = partition_name(month)
+    async with pg_session.bind.begin() as conn:
+        await conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+    chatroom_id = await make_room(pg_session)
+    old = await add_messages(pg_session, chatroom_id, 4, sent_at=datetime(2020, 1, 15))
+    hot = await add_messages(pg_session, chatroom_id, 3)
+
+    # Seen before archiving: the empty range is cached and must be dropped.
+    service = ArchiveService(pg_session)
+    assert await service.get_archive_range(chatroom_id) is None
+
+    archive = await service.archive_partition(name, month)
+    assert archive.row_count == 4
+    assert os.path.exists(archive_path(archive.path))
+    assert not os.path.exists(f"{archive_path(archive.path)}.tmp")
+    assert name not in [partition for partition, _ in await list_message_partitions(await pg_session.connection())]
+    assert await pg_session.scalar(text("SELECT to_regclass(:name)"), {"name": name}) is None
+    room = (await pg_session.execute(select(MessageArchiveChatroom))).scalar_one()
+    assert (room.chatroom_id, room.min_id, room.max_id, room.message_count) == (chatroom_id, old[0], old[-1], 4)
+    assert await service.get_archive_range(chatroom_id) == (old[0], old[-1])
+
+    chat = ChatroomService(pg_session)
+    messages, has_more = await chat.get_messages(chatroom_id, limit=5)
+    assert [message.id for message in messages] == old[-2:] + hot and has_more
+    messages, has_more = await chat.get_messages(chatroom_id, before=old[-2], limit=5)
+    assert [message.id for message in messages] == old[:2] and not has_more
+    messages, _ = await chat.get_messages(chatroom_id, after=old[0], limit=10)
+    assert [message.id for message in messages] == old[1:] + hot
+
+@postgres_only
+async def test_archive_partition_finishes_an_interrupted_run(pg_session, redis_client, archive_dir):
+    month = date(2020, 2, 1)
+    name = partition_name(month)
+    async with pg_session.bind.begin() as conn:
+        await conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+    chatroom_id = await make_room(pg_session)
+    await add_messages(pg_session, chatroom_id, 2, sent_at=datetime(2020, 2, 10))
+
+    # The copy committed, then the job died before the detach.
+    service = ArchiveService(pg_session)
+    await service._copy_partition(name, month)
+    archive = await service.archive_partition(name, month)
+    assert archive.row_count == 2
+    assert await pg_session.scalar(select(MessageArchive.id).where(MessageArchive.partition_name == name)) == archive.id
+    assert await pg_session.scalar(text("SELECT count(*) FROM message_archives")) == 1
+    assert await pg_session.scalar(text("SELECT to_regclass(:name)"), {"name": name}) is None
@@ -0,0 +1,32 @@
+from datetime import date
+
+import pytest
+
+from app.db.partitions import add_months, ensure_message_partitions, month_start, partition_month, partition_name
+from app.db.session import engine
+
+def test_month_start():
+    assert month_start(date(2026, 2, 28)) == date(2026, 2, 1)
+
+@pytest.mark.parametrize("month, months, expected", [
+    (date(2026, 1, 1), 1, date(2026, 2, 1)),
+    (date(2026, 11, 1), 2, date(2027, 1, 1)),
+    (date(2026, 1, 1), -1, date(2025, 12, 1)),
+    (date(2026, 3, 1), -15, date(2024, 12, 1)),
+    (date(2026, 12, 1), 0, date(2026, 12, 1)),
+])
+def test_add_months_crosses_year_boundaries(month, months, expected):
+    assert add_months(month, months) == expected
+
+def test_partition_name_round_trips():
+    assert partition_name(date(2026, 3, 1)) == "messages_y2026m03"
+    assert partition_month("messages_y2026m03") == date(2026, 3, 1)
+
+@pytest.mark.parametrize("name", ["messages_default", "messages_y2026m3", "messages_y2026m03_old", "messages"])
+def test_other_tables_are_not_partitions(name):
+    assert partition_month(name) is None
+
+async def test_ensure_partitions_is_a_no_op_when_not_partitioned(db):
+    # create_all schemas (SQLite here) keep messages as a plain table.
+    async with engine.begin() as conn:
+        assert await ensure_message_partitions(conn) == []
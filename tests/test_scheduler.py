@@ -0,0 +1,82 @@
+import asyncio
+
+from app.tasks.runtime import WeightedFairScheduler
+
+async def grant_order(scheduler: WeightedFairScheduler, jobs):
+    # Queues ``jobs`` behind a held slot, then frees slots one at a time.
+    order = []
+
+    async def job(job_class: str):
+        await scheduler.acquire(job_class)
+        order.append(job_class)
+
+    tasks = [asyncio.create_task(job(job_class)) for job_class in jobs]
+    await asyncio.sleep(0)
+    for _ in jobs:
+        scheduler.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+async def test_admits_up_to_capacity_without_waiting():
+    scheduler = WeightedFairScheduler(2, {})
+    await asyncio.wait_for(scheduler.acquire("pro"), 1)
+    await asyncio.wait_for(scheduler.acquire("basic"), 1)
+    assert scheduler.in_flight == 2
+
+    blocked = asyncio.create_task(scheduler.acquire("pro"))
+    await asyncio.sleep(0)
+    assert not blocked.done()
+    scheduler.release()
+    await asyncio.wait_for(blocked, 1)
+    assert scheduler.in_flight == 2
+
+async def test_backlog_is_shared_by_weight():
+    scheduler = WeightedFairScheduler(1, {"pro": 3, "basic": 1})
+    await scheduler.acquire("pro")
+
+    order = await grant_order(scheduler, ["basic"] * 8 + ["pro"] * 8)
+
+    # Smooth weighted round robin: three pro grants per basic one, interleaved
+    # rather than in bursts (ties go to the class that queued first). Once pro
+    # drains, basic gets every slot.
+    assert order[:8] == ["pro", "basic", "pro", "pro"] * 2
+    assert order[11:] == ["basic"] * 5
+
+async def test_unknown_classes_get_weight_one():
+    scheduler = WeightedFairScheduler(1, {"pro": 0})
+    await scheduler.acquire("default")
+
+    order = await grant_order(scheduler, ["pro", "pro", "default", "default"])
+
+    assert order == ["pro", "default", "pro", "default"]
+
+async def test_new_arrivals_queue_behind_waiters():
+    scheduler = WeightedFairScheduler(1, {})
+    await scheduler.acquire("basic")
+    waiting = asyncio.create_task(scheduler.acquire("basic"))
+    await asyncio.sleep(0)
+
+    scheduler.release()
+    late = asyncio.create_task(scheduler.acquire("pro"))
+    await asyncio.sleep(0)
+
+    assert waiting.done()
+    assert not late.done()
+    scheduler.release()
+    await asyncio.wait_for(late, 1)
+
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    scheduler = WeightedFairScheduler(1, {})
+    await scheduler.acquire("pro")
+    cancelled = asyncio.create_task(scheduler.acquire("pro"))
+    waiting = asyncio.create_task(scheduler.acquire("pro"))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.wait_for(waiting, 1)
+
+    assert cancelled.cancelled()
+    assert scheduler.in_flight == 1
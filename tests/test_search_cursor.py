@@ -0,0 +1,116 @@
+import re
+from datetime import datetime
+
+import httpx
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.api import chatroom as chatroom_api
+from app.api.chatroom import _decode_search_cursor, _encode_cursor
+from app.api.dependencies import get_token_user
+from app.core.exceptions import InvalidCursorException
+from app.db.models import User
+from app.db.session import get_db
+from app.main import app
+from app.services.chatroom_service import ChatroomService, render_highlight
+
+def test_cursor_round_trips_rank_exactly():
+    # ts_rank is a float4; the cursor must hand back the exact value or ties break.
+    rank = 0.06079271063208580
+    assert _decode_search_cursor(_encode_cursor(rank, 42)) == (rank, 42)
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    _encode_cursor(0.5),
+    _encode_cursor("high", 3),
+    _encode_cursor(0.5, None),
+    "eyJyYW5rIjogMC41fQ==",  # an object, not a list
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursorException):
+        _decode_search_cursor(cursor)
+
+# Ties on rank are common (same words, same length), so pages must break them by id.
+ROWS = [
+    {"id": message_id, "chatroom_id": 1, "chatroom_name": "room", "sender": "user",
+     "sent_at": datetime(2026, 1, 1), "highlight": "<mark>redis</mark>", "rank": rank}
+    for rank, message_id in [(0.9, 7), (0.5, 9), (0.5, 8), (0.5, 4), (0.5, 2), (0.1, 5), (0.1, 1)]
+]
+
+async def fake_search(self, user_id, query, cursor=None, limit=20):
+    rows = [row for row in ROWS if cursor is None or (row["rank"], row["id"]) < cursor]
+    return rows[:limit], len(rows) > limit
+
+async def test_pages_follow_rank_then_id_without_gaps(monkeypatch):
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(chatroom_api.ChatroomService, "search_messages", fake_search)
+    app.dependency_overrides[get_token_user] = lambda: User(id=1, role="basic")
+    app.dependency_overrides[get_db] = no_db
+    seen, cursor = [], None
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            while True:
+                params = {"q": "redis", "limit": 2}
+                if cursor:
+                    params["cursor"] = cursor
+                response = await client.get("/api/messages/search", params=params)
+                assert response.status_code == 200
+                page = response.json()
+                seen.extend(result["id"] for result in page["results"])
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            bad = await client.get("/api/messages/search", params={"q": "redis", "cursor": "bogus"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert seen == [row["id"] for row in ROWS]
+    assert bad.status_code == 400
+
+def test_highlight_escapes_message_markup():
+    headline = '<img src=x onerror=alert(1)> use redis & <script>'
+    assert render_highlight(headline) == (
+        "&lt;img src=x onerror=alert(1)&gt; use <mark>redis</mark> &amp; &lt;script&gt;"
+    )
+
+class CapturingSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+        rows = self.rows
+
+        class Result:
+            def mappings(self):
+                return self
+
+            def all(self):
+                return rows
+
+        return Result()
+
+async def test_search_statement_compiles_for_postgres():
+    row = {"id": 3, "chatroom_id": 1, "chatroom_name": "room", "sender": "ai",
+           "sent_at": datetime(2026, 1, 1), "rank": 0.5, "highlight": "<b>\ue000redis\ue001</b>"}
+    session = CapturingSession([row, {**row, "id": 2}])
+
+    rows, has_more = await ChatroomService(session).search_messages(7, "redis", cursor=(0.5, 9), limit=1)
+
+    assert has_more
+    assert [r["id"] for r in rows] == [3]
+    assert rows[0]["highlight"] == "&lt;b&gt;<mark>redis</mark>&lt;/b&gt;"
+
+    sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+    # Bind parameter names and casts vary across SQLAlchemy versions.
+    sql = re.sub(r"%\(\w+\)s(::\w+)?", "?", " ".join(sql.split()))
+    rank = "ts_rank(messages.search_vector, websearch_to_tsquery(?, ?))"
+    # Keyset on (rank, id): strictly after the cursor, ties broken by id.
+    assert f"({rank} < ? OR {rank} = ? AND messages.id < ?)" in sql
+    assert f"ORDER BY {rank} DESC, messages.id DESC LIMIT ?) AS anon_1" in sql
+    assert sql.endswith("ORDER BY anon_1.rank DESC, anon_1.id DESC")
+    assert "ts_headline(?, translate(anon_1.content, ?, ?)" in sql
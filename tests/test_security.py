@@ -0,0 +1,25 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core import security
+from app.core.security import create_access_token, decode_access_token
+
+def test_cached_payload_is_not_shared_with_callers():
+    token = create_access_token({"sub": "1"})
+    first = decode_access_token(token)
+    first["sub"] = "2"
+    first["role"] = "pro"
+
+    second = decode_access_token(token)
+    assert second["sub"] == "1"
+    assert "role" not in second
+    second["sub"] = "3"
+    assert decode_access_token(token)["sub"] == "1"
+
+def test_expired_cached_token_is_rejected(monkeypatch):
+    token = create_access_token({"sub": "1"})
+    decode_access_token(token)
+    monkeypatch.setattr(security.time, "time", lambda: 4102444800)
+    with pytest.raises(HTTPException) as exc_info:
+        decode_access_token(token)
+    assert exc_info.value.status_code == 401
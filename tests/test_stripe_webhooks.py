@@ -0,0 +1,78 @@
+import httpx
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.future import select
+
+from app.api import subscription as subscription_api
+from app.core.config import settings
+from app.db.models import StripeEvent
+from app.main import app
+from app.services.payment_service import PaymentService
+from loadtest.fake_stripe import invoice_payment_succeeded, send_webhook
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    event_ids = []
+    monkeypatch.setattr(
+        subscription_api.process_stripe_event, "apply_async",
+        lambda args, queue: event_ids.append(args[0])
+    )
+    return event_ids
+
+async def deliver(event: dict) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await send_webhook(client, "/api/webhook/stripe", event, settings.STRIPE_WEBHOOK_SECRET)
+
+async def test_redelivery_of_processed_event_is_not_enqueued(db, enqueued):
+    event = invoice_payment_succeeded("sub_unknown")
+
+    assert (await deliver(event)).status_code == 200
+    assert await PaymentService(db).process_webhook_event(event["id"])
+    assert (await deliver(event)).status_code == 200
+
+    assert enqueued == [event["id"]]
+    assert await db.scalar(select(StripeEvent.status).where(StripeEvent.id == event["id"])) == "processed"
+
+@pytest.mark.parametrize("status", ["pending", "failed"])
+async def test_redelivery_of_unfinished_event_is_enqueued_again(db, enqueued, status):
+    event = invoice_payment_succeeded("sub_unknown")
+    await deliver(event)
+    record = await db.get(StripeEvent, event["id"])
+    record.status = status
+    await db.commit()
+
+    await deliver(event)
+
+    assert enqueued == [event["id"], event["id"]]
+    assert len((await db.execute(select(StripeEvent))).scalars().all()) == 1
+
+async def test_bad_signature_is_rejected(db, enqueued):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await send_webhook(client, "/api/webhook/stripe", invoice_payment_succeeded("sub_x"), "whsec_wrong")
+    assert response.status_code == 400
+    assert enqueued == []
+
+async def test_processed_event_is_not_applied_twice(db, enqueued):
+    event = invoice_payment_succeeded("sub_unknown")
+    await deliver(event)
+
+    assert await PaymentService(db).process_webhook_event(event["id"])
+    assert not await PaymentService(db).process_webhook_event(event["id"])
+    assert (await db.get(StripeEvent, event["id"])).attempts == 1
+
+async def test_event_row_is_claimed_with_skip_locked():
+    # SQLite has no row locks, so this checks the statement Postgres receives:
+    # a second worker skips a row another worker holds instead of waiting on it
+    # and then applying the event again.
+    class CapturingSession:
+        async def execute(self, stmt):
+            self.stmt = stmt
+            raise RuntimeError("captured")
+
+    session = CapturingSession()
+    with pytest.raises(RuntimeError, match="captured"):
+        await PaymentService(session).process_webhook_event("evt_1")
+    sql = str(session.stmt.compile(dialect=postgresql.dialect()))
+    assert sql.rstrip().endswith("FOR UPDATE SKIP LOCKED")
@@ -0,0 +1,58 @@
+import fakeredis
+import pytest
+
+from app.core.exceptions import AuthUnavailableException
+from app.utils import cache, token_revocation
+from app.utils.token_revocation import BloomFilter, is_token_revoked, revoke_token, revoke_user_tokens
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(token_revocation, "_revoked_filter", BloomFilter(1000))
+    monkeypatch.setattr(token_revocation, "_user_epochs", {})
+    monkeypatch.setattr(token_revocation, "_next_refresh_at", 0.0)
+    monkeypatch.setattr(token_revocation, "_refresh_lock", None)
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(token_revocation.time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture
+def redis_down(redis_client, monkeypatch):
+    server = fakeredis.FakeServer()
+    server.connected = False
+    monkeypatch.setattr(cache, "redis_client", fakeredis.FakeAsyncRedis(server=server))
+
+async def test_revoked_token_is_rejected(redis_client):
+    await revoke_token({"jti": "abc", "exp": 4102444800})
+    assert await is_token_revoked({"sub": "1", "jti": "abc", "iat": 1})
+    assert not await is_token_revoked({"sub": "1", "jti": "other", "iat": 1})
+
+async def test_user_epoch_revokes_older_tokens(redis_client):
+    await revoke_user_tokens(7)
+    epoch = token_revocation._user_epochs["7"]
+    assert await is_token_revoked({"sub": "7", "iat": epoch - 1})
+    assert not await is_token_revoked({"sub": "7", "iat": epoch + 1})
+
+async def test_refresh_failure_keeps_snapshot_and_backs_off(redis_down, clock, capsys, monkeypatch):
+    monkeypatch.setattr(token_revocation, "_user_epochs", {"7": 500.0})
+
+    assert await is_token_revoked({"sub": "7", "iat": 100})
+    assert not await is_token_revoked({"sub": "8", "iat": 100})
+    assert "Token revocation refresh failed" in capsys.readouterr().out
+
+    # Within the backoff window no further refresh is attempted.
+    assert await is_token_revoked({"sub": "7", "iat": 100})
+    assert capsys.readouterr().out == ""
+
+    clock[0] += token_revocation.settings.JWT_REVOCATION_RETRY_SECONDS
+    await is_token_revoked({"sub": "8", "iat": 100})
+    assert "Token revocation refresh failed" in capsys.readouterr().out
+
+async def test_unconfirmed_filter_hit_fails_closed(redis_down):
+    token_revocation._revoked_filter.add("abc")
+    with pytest.raises(AuthUnavailableException) as exc_info:
+        await is_token_revoked({"sub": "1", "jti": "abc", "iat": 1})
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == "1"